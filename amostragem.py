@@ -0,0 +1,52 @@
+import numpy as np
+
+# Redução de séries longas para os gráficos.
+# Usa o algoritmo Largest-Triangle-Three-Buckets (LTTB): a série é dividida
+# em faixas e de cada faixa fica o ponto que forma o maior triângulo com o
+# ponto escolhido na faixa anterior e a média da faixa seguinte, o que
+# preserva picos e vales visíveis. O mínimo e o máximo globais são sempre
+# mantidos.
+
+
+# Índices dos pontos escolhidos pelo LTTB (em ordem crescente)
+def lttb(x, y, pontos):
+    quantidade = len(y)
+    if pontos >= quantidade or pontos < 3:
+        return np.arange(quantidade)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # O primeiro e o último ponto ficam fixos; os demais são divididos em pontos - 2 faixas
+    limites = np.linspace(1, quantidade - 1, pontos - 1).astype(np.int64)
+    escolhidos = np.empty(pontos, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = quantidade - 1
+
+    anterior = 0
+    for i in range(pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else quantidade
+        media_x = x[fim:proximo_fim].mean()
+        media_y = y[fim:proximo_fim].mean()
+
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+
+    return escolhidos
+
+
+# Reduz um DataFrame ordenado por `coluna_x` a cerca de `pontos` linhas
+def reduzir_serie(serie, coluna_x, coluna_y, pontos):
+    if len(serie) <= pontos:
+        return serie
+
+    x = serie[coluna_x].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    y = serie[coluna_y].to_numpy()
+
+    indices = np.union1d(lttb(x, y, pontos), [np.argmin(y), np.argmax(y)])
+    return serie.iloc[indices]
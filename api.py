@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import tornado.web
+
+import perfil
+from armazenamento import Armazenamento
+from escritor import EscritorEmGrupo
+from exportacao import TIPOS_CONTEUDO, csv_em_partes, escrever_xlsx
+from modelo import para_centavos
+from painel import despesas_por_categoria, metricas_mes, resumo_mensal
+from perfil import etapa
+
+# API HTTP/JSON para registrar e consultar transações sem passar pela
+# interface (scripts, atalhos do celular). Roda em um processo próprio, sobre
+# o mesmo banco do app:
+#   python -m api --banco financas.db --porta 8502
+#
+#   POST   /transacoes        transação -> {"id": ...}
+#   POST   /transacoes/lote   [transação, ...] -> {"ids": [...]}
+#   PUT    /transacoes/<id>   transação -> {"id": ...}
+#   DELETE /transacoes/<id>   -> {"id": ...}
+#   GET    /resumo            totais do mês (?ano=&mes=, padrão o mês atual)
+#   GET    /resumo/mensal     entradas e saídas de cada mês
+#   GET    /exportar          transações em CSV ou Excel (?formato=csv|xlsx&inicio=
+#                             &fim=&tipo=&categoria=, todos opcionais)
+#   GET    /metricas          duração acumulada das etapas, por etapa
+#
+# Uma transação é {"data": "aaaa-mm-dd", "descricao", "valor" (em reais),
+# "categoria", "tipo": "entrada" | "saida"}. As gravações passam pelo escritor
+# em grupo, como as do app: requisições simultâneas vão para o mesmo commit,
+# e os handlers esperam o resultado sem bloquear o loop de eventos.
+
+CAMPOS_TRANSACAO = ['data', 'descricao', 'valor', 'categoria', 'tipo']
+
+# Quantidade máxima de transações em um POST /transacoes/lote
+MAXIMO_TRANSACOES_LOTE = 10_000
+
+# Bytes enviados por vez na exportação em Excel
+TAMANHO_PARTE_EXPORTACAO = 1 << 16
+
+# Maior valor aceito em uma transação, em reais
+VALOR_MAXIMO = 1e12
+
+# Maior ID que cabe em um inteiro do SQLite
+MAIOR_ID = 2**63 - 1
+
+PORTA_PADRAO = 8502
+
+
+class ErroApi(tornado.web.HTTPError):
+    def __init__(self, status, mensagem):
+        super().__init__(status)
+        self.mensagem = mensagem
+
+
+# Confere os campos de uma transação recebida e devolve os valores normalizados
+def validar_transacao(transacao):
+    if not isinstance(transacao, dict):
+        raise ErroApi(400, 'A transação deve ser um objeto JSON.')
+    faltando = [campo for campo in CAMPOS_TRANSACAO if campo not in transacao]
+    if faltando:
+        raise ErroApi(400, f"Campos obrigatórios ausentes: {', '.join(faltando)}.")
+
+    try:
+        data = pd.to_datetime(transacao['data'], format='ISO8601')
+    except (ValueError, TypeError):
+        data = None
+    # None e '' não geram erro na conversão, mas também não são datas
+    if data is None or pd.isna(data):
+        raise ErroApi(400, f"Data inválida: {transacao['data']!r} (use aaaa-mm-dd).")
+    valor = transacao['valor']
+    # A comparação também recusa NaN, infinito e inteiros grandes demais para
+    # os centavos em int64; o valor precisa ter ao menos um centavo depois de arredondado
+    if (isinstance(valor, bool) or not isinstance(valor, (int, float)) or not 0 < valor < VALOR_MAXIMO
+            or para_centavos(valor) < 1):
+        raise ErroApi(400, f'O valor deve ser de ao menos 0.01 e menor que {VALOR_MAXIMO:.0f}.')
+    if transacao['tipo'] not in ('entrada', 'saida'):
+        raise ErroApi(400, "O tipo deve ser 'entrada' ou 'saida'.")
+    for campo in ['descricao', 'categoria']:
+        if not isinstance(transacao[campo], str) or not transacao[campo].strip():
+            raise ErroApi(400, f"O campo '{campo}' deve ser um texto não vazio.")
+
+    return {
+        'data': data,
+        'descricao': transacao['descricao'].strip(),
+        'valor': float(valor),
+        'categoria': transacao['categoria'].strip(),
+        'tipo': transacao['tipo'],
+    }
+
+
+def _recusar_constante(nome):
+    raise ValueError(f'Constante não permitida: {nome}')
+
+
+class ManipuladorBase(tornado.web.RequestHandler):
+    def initialize(self, armazenamento, escritor, token):
+        self.armazenamento = armazenamento
+        self.escritor = escritor
+        self.token = token
+
+    def prepare(self):
+        perfil.iniciar_execucao()
+        if self.token and not hmac.compare_digest(self.request.headers.get('Authorization', ''),
+                                                  f'Bearer {self.token}'):
+            raise ErroApi(401, 'Token de acesso ausente ou inválido.')
+
+    def on_finish(self):
+        perfil.finalizar_execucao(f'api {self.request.method} {self.request.path}')
+
+    def write_error(self, status_code, **kwargs):
+        erro = kwargs.get('exc_info', (None, None, None))[1]
+        self.finish({'erro': getattr(erro, 'mensagem', self._reason)})
+
+    # NaN e Infinity, aceitos pelo módulo json, não são JSON válido
+    def corpo_json(self):
+        try:
+            return json.loads(self.request.body, parse_constant=_recusar_constante)
+        except ValueError:
+            raise ErroApi(400, 'O corpo da requisição deve ser JSON.')
+
+    # Envia a operação ao escritor em grupo e espera o resultado sem bloquear
+    async def gravar(self, operacao, *argumentos):
+        with etapa('gravar'):
+            return await asyncio.wrap_future(self.escritor.agendar(operacao, *argumentos))
+
+    # Leituras do banco rodam em threads, fora do loop de eventos
+    async def ler(self, funcao, *argumentos):
+        with etapa('carregar'):
+            return await asyncio.get_running_loop().run_in_executor(None, funcao, *argumentos)
+
+
+class ManipuladorTransacoes(ManipuladorBase):
+    async def post(self):
+        transacao = validar_transacao(self.corpo_json())
+        id_transacao = await self.gravar('inserir', transacao)
+        self.set_status(201)
+        self.write({'id': id_transacao})
+
+
+class ManipuladorLote(ManipuladorBase):
+    async def post(self):
+        transacoes = self.corpo_json()
+        if not isinstance(transacoes, list) or not transacoes:
+            raise ErroApi(400, 'O lote deve ser uma lista não vazia de transações.')
+        if len(transacoes) > MAXIMO_TRANSACOES_LOTE:
+            raise ErroApi(413, f'O lote pode ter no máximo {MAXIMO_TRANSACOES_LOTE} transações.')
+
+        # O lote inteiro é gravado em uma só operação (tudo ou nada)
+        validas = pd.DataFrame([validar_transacao(transacao) for transacao in transacoes], columns=CAMPOS_TRANSACAO)
+        ids = await self.gravar('inserir_varias', validas)
+        self.set_status(201)
+        self.write({'ids': ids})
+
+
+class ManipuladorTransacao(ManipuladorBase):
+    # ID do caminho; um ID maior que os do banco não existe
+    def id_do_caminho(self, id_transacao):
+        if int(id_transacao) > MAIOR_ID:
+            raise ErroApi(404, f'Transação com ID {id_transacao} não encontrada.')
+        return int(id_transacao)
+
+    async def put(self, id_transacao):
+        id_transacao = self.id_do_caminho(id_transacao)
+        transacao = validar_transacao(self.corpo_json())
+        if not await self.gravar('atualizar', id_transacao, transacao):
+            raise ErroApi(404, f'Transação com ID {id_transacao} não encontrada.')
+        self.write({'id': id_transacao})
+
+    async def delete(self, id_transacao):
+        id_transacao = self.id_do_caminho(id_transacao)
+        if not await self.gravar('excluir', id_transacao):
+            raise ErroApi(404, f'Transação com ID {id_transacao} não encontrada.')
+        self.write({'id': id_transacao})
+
+
+class ManipuladorResumo(ManipuladorBase):
+    async def get(self):
+        hoje = datetime.now()
+        try:
+            ano = int(self.get_query_argument('ano', hoje.year))
+            mes = int(self.get_query_argument('mes', hoje.month))
+        except ValueError:
+            raise ErroApi(400, 'Ano e mês devem ser números inteiros.')
+        if not 1 <= mes <= 12:
+            raise ErroApi(400, 'O mês deve estar entre 1 e 12.')
+
+        resumo = await self.ler(self.armazenamento.carregar_resumo)
+        with etapa('agregar'):
+            resumo_mes, entradas_mes, saidas_mes, saldo_mes = metricas_mes(resumo, ano, mes)
+            despesas = despesas_por_categoria(resumo_mes)
+        self.write({
+            'ano': ano,
+            'mes': mes,
+            'entradas': float(entradas_mes),
+            'saidas': float(saidas_mes),
+            'saldo': float(saldo_mes),
+            'despesas_por_categoria': dict(zip(despesas['categoria'], despesas['valor'].astype(float))),
+        })
+
+
+class ManipuladorResumoMensal(ManipuladorBase):
+    async def get(self):
+        resumo = await self.ler(self.armazenamento.carregar_resumo)
+        with etapa('agregar'):
+            mensal = resumo_mensal(resumo).reindex(columns=['ano_mes', 'entrada', 'saida']).fillna(0)
+        self.write({'meses': [
+            {'mes': ano_mes, 'entradas': float(entrada), 'saidas': float(saida)}
+            for ano_mes, entrada, saida in mensal.itertuples(index=False, name=None)]})
+
+
+# Exportação enviada aos pedaços: o CSV sai bloco a bloco, conforme as
+# transações são lidas, e a planilha é escrita em um arquivo temporário e
+# enviada em seguida. Nenhum dos dois fica inteiro na memória.
+class ManipuladorExportacao(ManipuladorBase):
+    async def get(self):
+        formato = self.get_query_argument('formato', 'csv')
+        if formato not in TIPOS_CONTEUDO:
+            raise ErroApi(400, "O formato deve ser 'csv' ou 'xlsx'.")
+        filtros = {'tipo': self.get_query_argument('tipo', None),
+                   'categoria': self.get_query_argument('categoria', None)}
+        if filtros['tipo'] not in (None, 'entrada', 'saida'):
+            raise ErroApi(400, "O tipo deve ser 'entrada' ou 'saida'.")
+        # Período [inicio, fim], com as duas datas incluídas
+        for campo in ['inicio', 'fim']:
+            valor = self.get_query_argument(campo, None)
+            try:
+                filtros[campo] = None if valor is None else pd.to_datetime(valor, format='ISO8601')
+            except (ValueError, TypeError):
+                raise ErroApi(400, f'Data inválida: {valor!r} (use aaaa-mm-dd).')
+        if filtros['fim'] is not None:
+            filtros['fim'] += pd.Timedelta(days=1)
+
+        self.set_header('Content-Type', TIPOS_CONTEUDO[formato])
+        self.set_header('Content-Disposition', f'attachment; filename="financas.{formato}"')
+
+        # A leitura em blocos usa uma só conexão SQLite, que só pode ser usada
+        # na thread que a abriu: todos os passos rodam na mesma thread
+        loop = asyncio.get_running_loop()
+        blocos = self.armazenamento.iterar_transacoes(**filtros)
+        with ThreadPoolExecutor(max_workers=1) as leitor, etapa('exportar'):
+            try:
+                if formato == 'csv':
+                    partes = csv_em_partes(blocos)
+                    while (parte := await loop.run_in_executor(leitor, next, partes, None)) is not None:
+                        self.write(parte)
+                        await self.flush()
+                else:
+                    with tempfile.TemporaryFile() as destino:
+                        categorias = await loop.run_in_executor(leitor, self.armazenamento.carregar_categorias)
+                        await loop.run_in_executor(leitor, escrever_xlsx, blocos, destino, categorias)
+                        destino.seek(0)
+                        while parte := destino.read(TAMANHO_PARTE_EXPORTACAO):
+                            self.write(parte)
+                            await self.flush()
+            finally:
+                # Fecha a consulta (se o cliente desconectou no meio) na thread dela
+                await loop.run_in_executor(leitor, blocos.close)
+
+
+class ManipuladorMetricas(ManipuladorBase):
+    def get(self):
+        self.write(perfil.metricas_acumuladas())
+
+
+def criar_aplicacao(arquivo, token=None):
+    armazenamento = Armazenamento(arquivo)
+    argumentos = {'armazenamento': armazenamento, 'escritor': EscritorEmGrupo(armazenamento), 'token': token}
+    return tornado.web.Application([
+        (r'/transacoes', ManipuladorTransacoes, argumentos),
+        (r'/transacoes/lote', ManipuladorLote, argumentos),
+        (r'/transacoes/(\d+)', ManipuladorTransacao, argumentos),
+        (r'/resumo', ManipuladorResumo, argumentos),
+        (r'/resumo/mensal', ManipuladorResumoMensal, argumentos),
+        (r'/exportar', ManipuladorExportacao, argumentos),
+        (r'/metricas', ManipuladorMetricas, argumentos),
+    ])
+
+
+async def servir(arquivo, porta, endereco, token):
+    criar_aplicacao(arquivo, token).listen(porta, address=endereco)
+    print(f'API de finanças em http://{endereco}:{porta} (banco {arquivo})')
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API HTTP/JSON do app de finanças.')
+    parser.add_argument('--banco', default='financas.db', help='arquivo do banco SQLite (o mesmo do app)')
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO)
+    parser.add_argument('--endereco', default='127.0.0.1',
+                        help='endereço de escuta (use 0.0.0.0 para aceitar conexões da rede, com um token)')
+    args = parser.parse_args()
+
+    # Com FINANCAS_API_TOKEN definido, as requisições precisam de "Authorization: Bearer <token>"
+    perfil.configurar_log(os.environ.get('FINANCAS_LOG_PERFIL'))
+    asyncio.run(servir(args.banco, args.porta, args.endereco, os.environ.get('FINANCAS_API_TOKEN')))
+
+
+if __name__ == '__main__':
+    main()
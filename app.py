@@ -1,136 +1,161 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import os
+import tempfile
 from datetime import datetime
 import calendar
-import numpy as np
+from armazenamento import Armazenamento, transacoes_vazias, categorias_vazias, resumo_vazio
+from modelo import formatar_para_exibicao, formatar_reais, para_reais
+from escritor import EscritorEmGrupo
+from exportacao import TIPOS_CONTEUDO, csv_em_partes, escrever_xlsx
+from importacao import blocos_csv, blocos_ofx, importar_blocos, ler_colunas_csv, sugerir_mapeamento
+from memoria import TransacoesEmMemoria
+from recorrencias import FREQUENCIAS, recorrentes_vazias
+import perfil
+from perfil import etapa
+
+# Colunas disponíveis para ordenar as tabelas de transações
+ORDENACOES = {"Data": "data", "Valor": "valor_centavos", "Descrição": "descricao", "Categoria": "categoria", "ID": "id"}
 
 # Configuração da página
 st.set_page_config(page_title="App de Finanças Pessoais", layout="wide", initial_sidebar_state="expanded")
 
-# Função para verificar se a planilha existe e criar se não existir
-def verificar_criar_planilha():
+# Armazenamento compartilhado entre as sessões
+@st.cache_resource
+def obter_armazenamento(arquivo):
+    return Armazenamento(arquivo)
+
+# Escritor único que serializa e agrupa as gravações de todas as sessões
+@st.cache_resource
+def obter_escritor(arquivo):
+    return EscritorEmGrupo(obter_armazenamento(arquivo))
+
+# Transações em memória, compartilhadas entre as sessões e sincronizadas pela versão dos dados
+@st.cache_resource
+def obter_transacoes_em_memoria(arquivo):
+    return TransacoesEmMemoria(obter_armazenamento(arquivo))
+
+# Lança no livro-caixa as ocorrências recorrentes vencidas; roda uma vez por dia
+# em cada processo (e também sempre que uma regra é cadastrada)
+@st.cache_resource
+def lancar_recorrentes_do_dia(arquivo, dia):
+    return obter_escritor(arquivo).lancar_recorrentes(dia)
+
+# Função para verificar se o banco existe e criá-lo se não existir
+def verificar_criar_banco():
+    arquivo_banco = 'financas.db'
     arquivo_excel = 'financas.xlsx'
     
-    if not os.path.exists(arquivo_excel):
-        # Criando DataFrame para transações
-        df_transacoes = pd.DataFrame({
-            'id': [],
-            'data': [],
-            'descricao': [],
-            'valor': [],
-            'categoria': [],
-            'tipo': []  # 'entrada' ou 'saida'
-        })
-        
-        # Criando DataFrame para categorias
-        categorias_entradas = ['Salário', 'Investimentos', 'Freelance', 'Presente', 'Outros']
-        categorias_saidas = ['Alimentação', 'Moradia', 'Transporte', 'Saúde', 'Educação', 
-                           'Lazer', 'Vestuário', 'Contas', 'Compras', 'Outros']
-        
-        df_categorias = pd.DataFrame({
-            'tipo': ['entrada'] * len(categorias_entradas) + ['saida'] * len(categorias_saidas),
-            'categoria': categorias_entradas + categorias_saidas
-        })
-        
-        # Salvando DataFrames em planilhas separadas
-        with pd.ExcelWriter(arquivo_excel) as writer:
-            df_transacoes.to_excel(writer, sheet_name='Transacoes', index=False)
-            df_categorias.to_excel(writer, sheet_name='Categorias', index=False)
-        
-        st.success(f"Arquivo '{arquivo_excel}' criado com sucesso!")
+    armazenamento = obter_armazenamento(arquivo_banco)
+    
+    # Migrar a planilha antiga, se houver, para o banco; enquanto a importação
+    # não for concluída ela é tentada de novo a cada execução
+    try:
+        resultado = armazenamento.importar_planilha_antiga(arquivo_excel)
+        if resultado is not None:
+            st.success(f"{resultado['importadas']} transações importadas de '{arquivo_excel}'.")
+            if resultado['invalidas']:
+                st.warning(f"{resultado['invalidas']} linhas de '{arquivo_excel}' foram ignoradas "
+                           "(sem data, valor, descrição ou categoria, ou com tipo inválido).")
+        elif armazenamento.criado:
+            st.success(f"Arquivo '{arquivo_banco}' criado com sucesso!")
+    except Exception as e:
+        st.error(f"Erro ao importar '{arquivo_excel}': {e}")
+    armazenamento.criado = False
     
-    return arquivo_excel
+    return arquivo_banco
 
-# Carregar dados
+# Carregar categorias (não são alteradas pelas transações)
 @st.cache_data
+def carregar_categorias(arquivo):
+    return obter_armazenamento(arquivo).carregar_categorias()
+
+# Carregar as transações (só o dashboard precisa do livro-caixa inteiro em memória)
 def carregar_dados(arquivo):
     try:
-        transacoes = pd.read_excel(arquivo, sheet_name='Transacoes')
-        if not isinstance(transacoes, pd.DataFrame):
-            transacoes = pd.DataFrame({
-                'id': [],
-                'data': [],
-                'descricao': [],
-                'valor': [],
-                'categoria': [],
-                'tipo': []
-            })
-        elif not transacoes.empty:
-            # Adicionar coluna ID se não existir
-            if 'id' not in transacoes.columns:
-                transacoes['id'] = range(1, len(transacoes) + 1)
-            transacoes['data'] = pd.to_datetime(transacoes['data'])
-            
-        categorias = pd.read_excel(arquivo, sheet_name='Categorias')
-        if not isinstance(categorias, pd.DataFrame):
-            categorias = pd.DataFrame({
-                'tipo': [],
-                'categoria': []
-            })
-            
-        return transacoes, categorias
+        with etapa('carregar'):
+            # Aplica apenas as alterações feitas desde a última versão em memória
+            versao, transacoes = obter_transacoes_em_memoria(arquivo).obter_versionado()
+        return transacoes, versao
     except Exception as e:
         st.error(f"Erro ao carregar os dados: {e}")
-        # Retornar DataFrames vazios em caso de erro
-        return pd.DataFrame({
-            'id': [],
-            'data': [],
-            'descricao': [],
-            'valor': [],
-            'categoria': [],
-            'tipo': []
-        }), pd.DataFrame({
-            'tipo': [],
-            'categoria': []
-        })
-
-# Salvar todos os dados
-def salvar_dados(transacoes, categorias, arquivo):
+        # Retornar DataFrame vazio em caso de erro
+        return transacoes_vazias(), None
+
+# Carregar apenas as categorias (formulários)
+def carregar_dados_categorias(arquivo):
     try:
-        # Garantir que a coluna ID está presente e contígua
-        if 'id' not in transacoes.columns:
-            transacoes['id'] = range(1, len(transacoes) + 1)
-        else:
-            # Reindexar IDs para garantir que sejam contíguos
-            transacoes = transacoes.reset_index(drop=True)
-            transacoes['id'] = range(1, len(transacoes) + 1)
-        
-        # Salvar de volta no arquivo
-        with pd.ExcelWriter(arquivo) as writer:
-            transacoes.to_excel(writer, sheet_name='Transacoes', index=False)
-            categorias.to_excel(writer, sheet_name='Categorias', index=False)
-            
-        return True
+        with etapa('carregar'):
+            return carregar_categorias(arquivo)
     except Exception as e:
-        st.error(f"Erro ao salvar os dados: {e}")
-        return False
+        st.error(f"Erro ao carregar as categorias: {e}")
+        return categorias_vazias()
+
+# Versão atual dos dados, sem carregar as transações
+def carregar_versao(arquivo):
+    try:
+        with etapa('carregar'):
+            return obter_armazenamento(arquivo).versao()
+    except Exception as e:
+        st.error(f"Erro ao consultar o banco: {e}")
+        return None
+
+# Carregar o cubo de totais mensais usado pelo dashboard, por versão dos dados
+@st.cache_data(max_entries=16)
+def carregar_resumo(arquivo, versao):
+    try:
+        return obter_armazenamento(arquivo).carregar_resumo()
+    except Exception as e:
+        st.error(f"Erro ao carregar o resumo: {e}")
+        return resumo_vazio()
+
+# Carregar as regras de transações recorrentes
+def carregar_recorrentes(arquivo):
+    try:
+        with etapa('carregar'):
+            return obter_armazenamento(arquivo).carregar_recorrentes()
+    except Exception as e:
+        st.error(f"Erro ao carregar as transações recorrentes: {e}")
+        return recorrentes_vazias()
+
+# Figuras e métricas do dashboard, por versão dos dados, dia atual, período do
+# gráfico de saldo e regras recorrentes (usadas na previsão). Os objetos são
+# devolvidos sem cópia; as entradas menos usadas recentemente são descartadas
+# ao passar do limite. Os argumentos com "_" não entram na chave.
+@st.cache_resource(max_entries=8)
+def preparar_dashboard_em_cache(arquivo, versao, dia, periodo_saldo, recorrentes, _transacoes, _resumo, _saldo_corrente):
+    # O Plotly só é importado quando o dashboard é exibido
+    from painel import preparar_dashboard
+    return preparar_dashboard(_transacoes, _resumo, _saldo_corrente, periodo_saldo, recorrentes, versao)
+
+# Carregar uma página das transações do mês, por versão dos dados
+@st.cache_data(max_entries=64)
+def carregar_pagina(arquivo, ano, mes, tipo, ordenar_por, decrescente, limite, pagina, versao):
+    try:
+        inicio = pd.Timestamp(year=ano, month=mes, day=1)
+        return obter_armazenamento(arquivo).carregar_pagina(
+            inicio, inicio + pd.offsets.MonthBegin(1), None if tipo == "Todos" else tipo,
+            ordenar_por, decrescente, limite, (pagina - 1) * limite)
+    except Exception as e:
+        st.error(f"Erro ao carregar as transações do mês: {e}")
+        return transacoes_vazias()
+
+# Buscar transações pela descrição em todo o histórico, por versão dos dados
+@st.cache_data(max_entries=32)
+def buscar_transacoes(arquivo, termo, aproximada, tipo, versao):
+    try:
+        return obter_armazenamento(arquivo).buscar_transacoes(termo, aproximada, None if tipo == "Todos" else tipo)
+    except Exception as e:
+        st.error(f"Erro ao buscar as transações: {e}")
+        return 0, transacoes_vazias()
 
 # Adicionar nova transação
 def adicionar_transacao(nova_transacao, arquivo):
     try:
-        transacoes, categorias = carregar_dados(arquivo)
-        
-        # Converter para o formato correto se necessário
-        nova_transacao['data'] = pd.to_datetime(nova_transacao['data'])
-        nova_transacao['valor'] = float(nova_transacao['valor'])
-        
-        # Gerar ID para a nova transação
-        if 'id' not in transacoes.columns or transacoes.empty:
-            nova_transacao['id'] = 1
-        else:
-            nova_transacao['id'] = transacoes['id'].max() + 1
-        
-        # Adicionar nova transação
-        nova_linha = pd.DataFrame([nova_transacao])
-        transacoes = pd.concat([transacoes, nova_linha], ignore_index=True)
-        
-        if salvar_dados(transacoes, categorias, arquivo):
-            st.success("Transação adicionada com sucesso!")
-            return True
-        return False
+        with etapa('gravar'):
+            obter_escritor(arquivo).inserir_transacao(nova_transacao)
+        st.success("Transação adicionada com sucesso!")
+        return True
     except Exception as e:
         st.error(f"Erro ao adicionar a transação: {e}")
         return False
@@ -138,27 +163,15 @@ def adicionar_transacao(nova_transacao, arquivo):
 # Editar transação existente
 def editar_transacao(id_transacao, transacao_atualizada, arquivo):
     try:
-        transacoes, categorias = carregar_dados(arquivo)
-        
-        # Converter para o formato correto se necessário
-        transacao_atualizada['data'] = pd.to_datetime(transacao_atualizada['data'])
-        transacao_atualizada['valor'] = float(transacao_atualizada['valor'])
-        transacao_atualizada['id'] = int(id_transacao)
+        with etapa('gravar'):
+            atualizada = obter_escritor(arquivo).atualizar_transacao(id_transacao, transacao_atualizada)
         
-        # Encontrar o índice da transação a ser atualizada
-        indice = transacoes[transacoes['id'] == id_transacao].index
-        
-        if len(indice) == 0:
+        if not atualizada:
             st.error(f"Transação com ID {id_transacao} não encontrada.")
             return False
         
-        # Atualizar transação
-        transacoes.loc[indice[0]] = transacao_atualizada
-        
-        if salvar_dados(transacoes, categorias, arquivo):
-            st.success("Transação atualizada com sucesso!")
-            return True
-        return False
+        st.success("Transação atualizada com sucesso!")
+        return True
     except Exception as e:
         st.error(f"Erro ao editar a transação: {e}")
         return False
@@ -166,104 +179,196 @@ def editar_transacao(id_transacao, transacao_atualizada, arquivo):
 # Excluir transação
 def excluir_transacao(id_transacao, arquivo):
     try:
-        transacoes, categorias = carregar_dados(arquivo)
+        with etapa('gravar'):
+            excluida = obter_escritor(arquivo).excluir_transacao(id_transacao)
         
-        # Encontrar a transação a ser excluída
-        if id_transacao not in transacoes['id'].values:
+        if not excluida:
             st.error(f"Transação com ID {id_transacao} não encontrada.")
             return False
         
-        # Excluir transação
-        transacoes = transacoes[transacoes['id'] != id_transacao]
-        
-        if salvar_dados(transacoes, categorias, arquivo):
-            st.success("Transação excluída com sucesso!")
-            return True
-        return False
+        st.success("Transação excluída com sucesso!")
+        return True
     except Exception as e:
         st.error(f"Erro ao excluir a transação: {e}")
         return False
 
-# Preparar gráficos e métricas
-def preparar_dashboard(transacoes):
-    # Garantir que transacoes seja um DataFrame
-    if not isinstance(transacoes, pd.DataFrame):
-        transacoes = pd.DataFrame({
-            'id': [],
-            'data': [],
-            'descricao': [],
-            'valor': [],
-            'categoria': [],
-            'tipo': []
-        })
-        
-    # Inicializar variáveis com valores padrão
-    fig_pizza = None
-    fig_barras = None
-    fig_linha = None
-    ultimas_transacoes = pd.DataFrame()
-    df_mes = pd.DataFrame()
-    entradas_mes = 0.0
-    saidas_mes = 0.0
-    saldo_mes = 0.0
+# Cadastrar uma regra recorrente e lançar as ocorrências que já venceram
+def adicionar_recorrente(regra, arquivo):
+    try:
+        with etapa('gravar'):
+            escritor = obter_escritor(arquivo)
+            escritor.inserir_recorrente(regra)
+            lancadas = escritor.lancar_recorrentes(datetime.now().date())
+        st.success("Transação recorrente cadastrada com sucesso!" +
+                   (f" {len(lancadas)} ocorrências já vencidas foram lançadas." if lancadas else ""))
+        return True
+    except Exception as e:
+        st.error(f"Erro ao cadastrar a transação recorrente: {e}")
+        return False
+
+# Excluir uma regra recorrente (as ocorrências já lançadas são mantidas)
+def excluir_recorrente(id_regra, arquivo):
+    try:
+        with etapa('gravar'):
+            excluida = obter_escritor(arquivo).excluir_recorrente(id_regra)
         
-    if transacoes.empty:
-        return fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes
-    
-    # Converter coluna de data para datetime se não estiver
-    transacoes['data'] = pd.to_datetime(transacoes['data'])
-    
-    # Filtrar para o mês atual
-    mes_atual = datetime.now().month
-    ano_atual = datetime.now().year
-    df_mes = transacoes[(transacoes['data'].dt.month == mes_atual) & 
-                        (transacoes['data'].dt.year == ano_atual)]
-    
-    # Calcular saldo
-    entradas = transacoes[transacoes['tipo'] == 'entrada']['valor'].sum()
-    saidas = transacoes[transacoes['tipo'] == 'saida']['valor'].sum()
-    saldo = entradas - saidas
-    
-    # Calcular entradas e saídas do mês atual
-    entradas_mes = df_mes[df_mes['tipo'] == 'entrada']['valor'].sum()
-    saidas_mes = df_mes[df_mes['tipo'] == 'saida']['valor'].sum()
-    saldo_mes = entradas_mes - saidas_mes
+        if not excluida:
+            st.error(f"Transação recorrente com ID {id_regra} não encontrada.")
+            return False
+        
+        st.success("Transação recorrente excluída com sucesso!")
+        return True
+    except Exception as e:
+        st.error(f"Erro ao excluir a transação recorrente: {e}")
+        return False
+
+# Exportação das transações (todas ou de um período, tipo e categoria) em
+# Excel ou CSV. O arquivo é escrito em disco aos blocos, sem carregar as
+# transações na memória, e só então entregue ao botão de download.
+def exportar_transacoes(arquivo):
+    st.sidebar.subheader("Exportar")
+    with st.sidebar.expander("Exportar transações"):
+        formato = st.radio("Formato", ["xlsx", "csv"], horizontal=True, key="formato_exportacao")
+        periodo = st.date_input("Período (opcional)", value=(), key="periodo_exportacao")
+        tipo = st.selectbox("Tipo", ["Todos", "entrada", "saida"], key="tipo_exportacao")
+        categorias = carregar_dados_categorias(arquivo)
+        if tipo != "Todos":
+            categorias = categorias[categorias['tipo'] == tipo]
+        categoria = st.selectbox("Categoria", ["Todas"] + sorted(categorias['categoria'].unique().tolist()),
+                                 key="categoria_exportacao")
+
+        if st.button("Gerar arquivo"):
+            filtros = {
+                'inicio': periodo[0] if len(periodo) == 2 else None,
+                'fim': periodo[1] + pd.Timedelta(days=1) if len(periodo) == 2 else None,
+                'tipo': None if tipo == "Todos" else tipo,
+                'categoria': None if categoria == "Todas" else categoria,
+            }
+            try:
+                with etapa('exportar'), tempfile.TemporaryFile() as destino:
+                    armazenamento = obter_armazenamento(arquivo)
+                    blocos = armazenamento.iterar_transacoes(**filtros)
+                    if formato == "xlsx":
+                        escrever_xlsx(blocos, destino, armazenamento.carregar_categorias())
+                    else:
+                        for parte in csv_em_partes(blocos):
+                            destino.write(parte)
+                    destino.seek(0)
+                    dados = destino.read()
+                st.download_button(f"Baixar financas.{formato}", dados, file_name=f'financas.{formato}',
+                                   mime=TIPOS_CONTEUDO[formato])
+            except Exception as e:
+                st.error(f"Erro ao exportar os dados: {e}")
+
+# Categoria sugerida pelo histórico para a descrição digitada
+def sugerir_categoria(arquivo, descricao, tipo):
+    try:
+        with etapa('sugerir'):
+            return obter_transacoes_em_memoria(arquivo).obter_sugestor().sugerir(descricao, tipo)
+    except Exception as e:
+        st.error(f"Erro ao sugerir a categoria: {e}")
+        return None
+
+# Importação em massa de um extrato bancário (CSV ou OFX), gravada em blocos
+def form_importacao(arquivo):
+    extrato = st.file_uploader("Extrato (CSV ou OFX)", type=["csv", "ofx"])
+    if extrato is None:
+        return
     
-    # Gráfico de Pizza para categorias de despesas no mês atual
-    despesas_no_mes = df_mes[df_mes['tipo'] == 'saida']
-    if not despesas_no_mes.empty:
-        despesas_por_categoria = despesas_no_mes.groupby('categoria')['valor'].sum().reset_index()
-        fig_pizza = px.pie(despesas_por_categoria, values='valor', names='categoria', 
-                          title='Despesas por Categoria (Mês Atual)')
+    if extrato.name.lower().endswith('.ofx'):
+        blocos = lambda: blocos_ofx(extrato)
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            separador = st.selectbox("Separador", [";", ",", "\t"], format_func=lambda s: "Tabulação" if s == "\t" else s)
+        with col2:
+            decimal = st.selectbox("Separador decimal", [",", "."])
+        with col3:
+            codificacao = st.selectbox("Codificação", ["utf-8", "latin-1"])
+        
+        try:
+            colunas = ler_colunas_csv(extrato, separador, codificacao)
+        except Exception as e:
+            st.error(f"Erro ao ler o arquivo: {e}")
+            return
+        
+        # Associar as colunas do arquivo aos campos da transação
+        sugestao = sugerir_mapeamento(colunas)
+        opcoes = [None] + colunas
+        mapeamento = {}
+        col1, col2, col3, col4 = st.columns(4)
+        for coluna, (campo, rotulo) in zip([col1, col2, col3, col4], [
+                ('data', "Coluna da data"), ('descricao', "Coluna da descrição"),
+                ('valor', "Coluna do valor"), ('tipo', "Coluna do tipo (opcional)")]):
+            with coluna:
+                mapeamento[campo] = st.selectbox(rotulo, opcoes, index=opcoes.index(sugestao[campo]),
+                                                 format_func=lambda c: "—" if c is None else c)
+        
+        if not all(mapeamento[campo] for campo in ['data', 'descricao', 'valor']):
+            st.warning("Escolha as colunas de data, descrição e valor.")
+            return
+        escolhidas = [c for c in mapeamento.values() if c is not None]
+        if len(escolhidas) != len(set(escolhidas)):
+            st.warning("Cada coluna do arquivo só pode ser usada em um campo.")
+            return
+        blocos = lambda: blocos_csv(extrato, mapeamento, separador, decimal, codificacao)
     
-    # Gráfico de Barras para entradas/saídas por mês
-    transacoes['ano_mes'] = transacoes['data'].dt.strftime('%Y-%m')
-    resumo_mensal = transacoes.groupby(['ano_mes', 'tipo'])['valor'].sum().unstack().reset_index()
+    if st.button("Importar Extrato"):
+        progresso = st.empty()
+        try:
+            extrato.seek(0)
+            with etapa('gravar'):
+                # As categorias são sugeridas pelo histórico de transações
+                sugestor = obter_transacoes_em_memoria(arquivo).obter_sugestor()
+                resultado = importar_blocos(
+                    blocos(), obter_escritor(arquivo).importar_transacoes,
+                    lambda parcial: progresso.text(f"{parcial['importadas']} transações importadas até agora..."),
+                    sugestor.categorizar)
+            progresso.empty()
+            st.success(f"{resultado['importadas']} transações importadas, {resultado['duplicadas']} já existentes "
+                       f"e {resultado['invalidas']} linhas ignoradas (sem data ou valor).")
+        except Exception as e:
+            st.error(f"Erro ao importar o extrato: {e}")
+
+# Tabela paginada das transações do mês; só a página visível é lida, formatada
+# e enviada ao navegador. Devolve o total de transações que atendem ao filtro.
+def tabela_transacoes_mes(arquivo, resumo, ano, mes, tipo, versao, chave):
+    # Total lido do cubo de resumo, sem contar as transações
+    resumo_mes = resumo[(resumo['ano'] == ano) & (resumo['mes'] == mes)]
+    if tipo != "Todos":
+        resumo_mes = resumo_mes[resumo_mes['tipo'] == tipo]
+    total = int(resumo_mes['quantidade'].sum())
+    if total == 0:
+        return 0
     
-    if not resumo_mensal.empty and all(col in resumo_mensal.columns for col in ['entrada', 'saida']):
-        resumo_mensal.fillna(0, inplace=True)
-        fig_barras = px.bar(resumo_mensal, x='ano_mes', y=['entrada', 'saida'], 
-                           title='Entradas e Saídas por Mês',
-                           labels={'value': 'Valor', 'ano_mes': 'Mês', 'variable': 'Tipo'},
-                           barmode='group')
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        ordenar_por = st.selectbox("Ordenar por", list(ORDENACOES), key=f"ordenar_{chave}")
+    with col2:
+        decrescente = st.checkbox("Ordem decrescente", key=f"decrescente_{chave}")
+    with col3:
+        limite = st.selectbox("Linhas por página", [25, 50, 100], key=f"limite_{chave}")
     
-    # Evolução do saldo
-    if not transacoes.empty:
-        transacoes_ordenadas = transacoes.sort_values('data')
-        transacoes_ordenadas['saldo_acumulado'] = transacoes_ordenadas.apply(
-            lambda x: x['valor'] if x['tipo'] == 'entrada' else -x['valor'], axis=1).cumsum()
-        
-        fig_linha = px.line(transacoes_ordenadas, x='data', y='saldo_acumulado', 
-                          title='Evolução do Saldo ao Longo do Tempo')
+    paginas = -(-total // limite)
+    # Manter a página selecionada dentro do intervalo quando o filtro muda
+    if st.session_state.get(f"pagina_{chave}", 1) > paginas:
+        st.session_state[f"pagina_{chave}"] = paginas
+    with col4:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"pagina_{chave}")
     
-    # Últimas transações
-    if not transacoes.empty:
-        ultimas_transacoes = transacoes.sort_values('data', ascending=False).head(5)
+    with etapa('carregar'):
+        transacoes_pagina = carregar_pagina(arquivo, ano, mes, tipo, ORDENACOES[ordenar_por], decrescente,
+                                            limite, pagina, versao)
+    with etapa('renderizar'):
+        transacoes_formatadas = formatar_para_exibicao(transacoes_pagina)
+        st.dataframe(transacoes_formatadas[['id', 'data', 'descricao', 'categoria', 'tipo', 'valor']],
+                     use_container_width=True, hide_index=True)
+    st.caption(f"Página {pagina} de {paginas} ({total} transações)")
     
-    return fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes
+    return total
 
 # Formulário para cadastro/edição de transação
-def form_transacao(categorias, tipo_inicial=None, dados_iniciais=None):
+def form_transacao(categorias, tipo_inicial=None, dados_iniciais=None, sugerir=None):
     col1, col2 = st.columns(2)
     
     with col1:
@@ -293,16 +398,16 @@ def form_transacao(categorias, tipo_inicial=None, dados_iniciais=None):
     with col2:
         if dados_iniciais:
             descricao = st.text_input("Descrição", value=dados_iniciais['descricao'])
-            valor = st.number_input("Valor (R$)", min_value=0.01, step=0.01, value=float(dados_iniciais['valor']))
+            valor = st.number_input("Valor (R$)", min_value=0.01, step=0.01, value=para_reais(dados_iniciais['valor_centavos']))
         else:
             descricao = st.text_input("Descrição")
             valor = st.number_input("Valor (R$)", min_value=0.01, step=0.01)
         
-        # Campo de sugestão inteligente (simulado)
-        if descricao.lower().startswith("super") and not dados_iniciais:
-            st.info("Sugestão: Essa parece ser uma compra de supermercado. Categoria recomendada: Alimentação")
-        elif (descricao.lower().startswith("conta") or descricao.lower().startswith("fatura")) and not dados_iniciais:
-            st.info("Sugestão: Essa parece ser uma conta. Categoria recomendada: Contas")
+        # Sugestão de categoria aprendida com as transações já registradas
+        if descricao and sugerir is not None and not dados_iniciais:
+            sugestao = sugerir(descricao, tipo)
+            if sugestao is not None and sugestao != categoria:
+                st.info(f"Sugestão: transações parecidas costumam ser da categoria {sugestao}.")
     
     return {
         'data': data,
@@ -312,26 +417,106 @@ def form_transacao(categorias, tipo_inicial=None, dados_iniciais=None):
         'tipo': tipo
     }
 
+# Intervalo de datas do histórico, ou None se não houver pelo menos dois dias
+def limites_historico(transacoes):
+    if transacoes.empty:
+        return None
+    # As transações estão ordenadas por data
+    primeira, ultima = transacoes['data'].iloc[0].date(), transacoes['data'].iloc[-1].date()
+    return (primeira, ultima) if primeira < ultima else None
+
+# Período [inicio, fim) do gráfico de saldo a partir do controle de período
+def periodo_grafico_saldo(transacoes):
+    limites = limites_historico(transacoes)
+    periodo = st.session_state.get("periodo_saldo")
+    if limites is None or periodo is None:
+        return None
+    inicio, fim = max(periodo[0], limites[0]), min(periodo[1], limites[1])
+    if (inicio, fim) == limites:
+        return None
+    return pd.Timestamp(inicio), pd.Timestamp(fim) + pd.Timedelta(days=1)
+
+# Controle para aproximar o gráfico de saldo: a série completa é reduzida para
+# poucos pontos, e um período menor é exibido com mais detalhe
+def seletor_periodo_saldo(transacoes):
+    limites = limites_historico(transacoes)
+    if limites is None:
+        return
+    periodo = st.session_state.get("periodo_saldo")
+    limites_anteriores = st.session_state.get("limites_periodo_saldo")
+    # Acompanhar o histórico inteiro enquanto não houver aproximação, e manter o
+    # período escolhido dentro do histórico atual
+    if (periodo is None or periodo == limites_anteriores or
+            periodo[0] < limites[0] or periodo[1] > limites[1] or periodo[0] > periodo[1]):
+        st.session_state["periodo_saldo"] = limites
+    st.session_state["limites_periodo_saldo"] = limites
+    st.slider("Período do gráfico de saldo", min_value=limites[0], max_value=limites[1],
+              format="DD/MM/YYYY", key="periodo_saldo")
+
+# Painel opcional com a duração de cada etapa desta execução e as médias acumuladas
+def exibir_painel_desempenho(etapas):
+    st.sidebar.subheader("Desempenho")
+    st.sidebar.dataframe(
+        pd.DataFrame(etapas, columns=['etapa', 'segundos']).groupby('etapa', sort=False)['segundos'].sum()
+        .mul(1000).round(2).rename('ms (execução)'),
+        use_container_width=True)
+    
+    metricas = pd.DataFrame.from_dict(perfil.metricas_acumuladas(), orient='index')
+    if not metricas.empty:
+        metricas['média (ms)'] = (metricas['total_segundos'] / metricas['execucoes'] * 1000).round(2)
+        metricas['máximo (ms)'] = (metricas['maximo_segundos'] * 1000).round(2)
+        st.sidebar.dataframe(metricas[['execucoes', 'média (ms)', 'máximo (ms)']], use_container_width=True)
+
 # Função principal
 def main():
+    # Cronometrar as etapas desta execução; o log de desempenho (linhas JSON)
+    # é ativado com FINANCAS_LOG_PERFIL=<arquivo> ou FINANCAS_LOG_PERFIL=-
+    perfil.configurar_log(os.environ.get('FINANCAS_LOG_PERFIL'))
+    perfil.iniciar_execucao()
+    try:
+        exibir_app()
+    finally:
+        etapas = perfil.finalizar_execucao(st.session_state.get('pagina'))
+    
+    if st.sidebar.checkbox("Mostrar painel de desempenho", key="painel_desempenho"):
+        exibir_painel_desempenho(etapas)
+
+def exibir_app():
     st.title("App de Finanças Pessoais")
     
-    # Verificar/criar planilha
-    arquivo_excel = verificar_criar_planilha()
+    # Verificar/criar banco de dados
+    arquivo_banco = verificar_criar_banco()
     
-    # Carregar dados
-    transacoes, categorias = carregar_dados(arquivo_excel)
+    # Lançar as transações recorrentes que venceram
+    try:
+        lancar_recorrentes_do_dia(arquivo_banco, datetime.now().date())
+    except Exception as e:
+        st.error(f"Erro ao lançar as transações recorrentes: {e}")
     
     # Barra lateral para navegação
     st.sidebar.title("Menu")
     opcao = st.sidebar.radio("Selecione uma opção", 
-                            ["Dashboard", "Nova Transação", "Gerenciar Transações"])
+                            ["Dashboard", "Nova Transação", "Importar Extrato", "Transações Recorrentes", "Gerenciar Transações"], key="pagina")
     
+    exportar_transacoes(arquivo_banco)
+    
+    # Cada página carrega apenas os dados que usa
     if opcao == "Dashboard":
         st.header("Dashboard Financeiro")
         
-        # Preparar dados para o dashboard
-        fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes = preparar_dashboard(transacoes)
+        transacoes, versao = carregar_dados(arquivo_banco)
+        memoria = obter_transacoes_em_memoria(arquivo_banco)
+        with etapa('carregar'):
+            resumo = carregar_resumo(arquivo_banco, versao)
+        
+        # Período do gráfico de saldo escolhido no controle abaixo dele (execução anterior)
+        periodo_saldo = periodo_grafico_saldo(transacoes)
+        
+        # Preparar dados para o dashboard (reaproveitados enquanto os dados não mudarem)
+        recorrentes = carregar_recorrentes(arquivo_banco)
+        fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes = preparar_dashboard_em_cache(
+            arquivo_banco, versao, datetime.now().date(), periodo_saldo, recorrentes,
+            transacoes, resumo, memoria.saldo_corrente)
         
         # Exibir métricas
         col1, col2, col3 = st.columns(3)
@@ -345,57 +530,117 @@ def main():
         
         # Exibir gráficos
         if fig_pizza:
-            st.plotly_chart(fig_pizza, use_container_width=True)
+            with etapa('renderizar'):
+                st.plotly_chart(fig_pizza, use_container_width=True)
         else:
             st.info("Não há dados de despesas para o mês atual.")
         
         col1, col2 = st.columns(2)
         with col1:
             if fig_barras:
-                st.plotly_chart(fig_barras, use_container_width=True)
+                with etapa('renderizar'):
+                    st.plotly_chart(fig_barras, use_container_width=True)
             else:
                 st.info("Dados insuficientes para gráfico de barras.")
         
         with col2:
             if fig_linha:
-                st.plotly_chart(fig_linha, use_container_width=True)
+                with etapa('renderizar'):
+                    st.plotly_chart(fig_linha, use_container_width=True)
+                seletor_periodo_saldo(transacoes)
             else:
                 st.info("Dados insuficientes para gráfico de linha.")
         
         # Últimas transações
         st.subheader("Últimas Transações")
         if not ultimas_transacoes.empty:
-            ultimas_transacoes_formatadas = ultimas_transacoes.copy()
-            ultimas_transacoes_formatadas['data'] = ultimas_transacoes_formatadas['data'].dt.strftime('%d/%m/%Y')
-            ultimas_transacoes_formatadas['valor'] = ultimas_transacoes_formatadas['valor'].apply(lambda x: f"R$ {x:.2f}")
-            st.dataframe(ultimas_transacoes_formatadas[['data', 'descricao', 'categoria', 'tipo', 'valor']], use_container_width=True)
+            with etapa('renderizar'):
+                ultimas_transacoes_formatadas = formatar_para_exibicao(ultimas_transacoes)
+                st.dataframe(ultimas_transacoes_formatadas[['data', 'descricao', 'categoria', 'tipo', 'valor']], use_container_width=True)
         else:
             st.info("Não há transações registradas.")
     
     elif opcao == "Nova Transação":
         st.header("Registrar Nova Transação")
         
+        categorias = carregar_dados_categorias(arquivo_banco)
+        
         # Formulário de transação
-        nova_transacao = form_transacao(categorias)
+        nova_transacao = form_transacao(
+            categorias, sugerir=lambda descricao, tipo: sugerir_categoria(arquivo_banco, descricao, tipo))
         
         if st.button("Salvar Transação"):
             if nova_transacao['descricao'] and nova_transacao['valor'] > 0:
-                if adicionar_transacao(nova_transacao, arquivo_excel):
+                if adicionar_transacao(nova_transacao, arquivo_banco):
                     # Atualiza os dados após adicionar uma nova transação
-                    st.cache_data.clear()
                     st.rerun()
             else:
                 st.warning("Preencha todos os campos corretamente.")
     
+    elif opcao == "Importar Extrato":
+        st.header("Importar Extrato Bancário")
+        form_importacao(arquivo_banco)
+    
+    elif opcao == "Transações Recorrentes":
+        st.header("Transações Recorrentes")
+        
+        # Regras cadastradas; as ocorrências entram no livro-caixa quando vencem
+        recorrentes = carregar_recorrentes(arquivo_banco)
+        if not recorrentes.empty:
+            st.dataframe(
+                recorrentes.assign(valor=formatar_reais(recorrentes['valor_centavos']))[
+                    ['id', 'descricao', 'categoria', 'tipo', 'valor', 'frequencia', 'intervalo', 'inicio', 'fim',
+                     'ultima_lancada']],
+                use_container_width=True, hide_index=True)
+        else:
+            st.info("Não há transações recorrentes cadastradas.")
+        
+        st.subheader("Nova Transação Recorrente")
+        categorias = carregar_dados_categorias(arquivo_banco)
+        regra = form_transacao(categorias)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            frequencia = st.selectbox("Frequência", FREQUENCIAS, index=FREQUENCIAS.index('mensal'))
+        with col2:
+            intervalo = st.number_input("A cada (semanas, meses ou anos)", min_value=1, step=1, value=1)
+        with col3:
+            fim = st.date_input("Data final (opcional)", value=None)
+        
+        if st.button("Salvar Transação Recorrente"):
+            if not regra['descricao'] or regra['valor'] <= 0:
+                st.warning("Preencha todos os campos corretamente.")
+            elif fim is not None and fim < regra['data']:
+                st.warning("A data final deve ser posterior à data de início.")
+            else:
+                # A data do formulário é a primeira ocorrência
+                regra = {**{campo: valor for campo, valor in regra.items() if campo != 'data'},
+                         'inicio': regra['data'], 'frequencia': frequencia, 'intervalo': intervalo, 'fim': fim}
+                if adicionar_recorrente(regra, arquivo_banco):
+                    st.rerun()
+        
+        if not recorrentes.empty:
+            st.subheader("Excluir Transação Recorrente")
+            id_regra = st.selectbox("ID da transação recorrente", recorrentes['id'].tolist())
+            if st.button("Excluir Transação Recorrente", type="primary"):
+                if excluir_recorrente(id_regra, arquivo_banco):
+                    st.rerun()
+    
     elif opcao == "Gerenciar Transações":
         st.header("Gerenciar Transações")
         
-        if transacoes.empty:
+        # O cubo de resumo basta para saber se há transações e quantas há por mês
+        versao = carregar_versao(arquivo_banco)
+        with etapa('carregar'):
+            resumo = carregar_resumo(arquivo_banco, versao)
+        if resumo.empty:
             st.info("Não há transações registradas.")
             return
         
+        categorias = carregar_dados_categorias(arquivo_banco)
+        armazenamento = obter_armazenamento(arquivo_banco)
+        
         # Abas para visualizar/editar/excluir
-        tab1, tab2 = st.tabs(["Visualizar e Editar", "Excluir"])
+        tab1, tab2, tab3 = st.tabs(["Visualizar e Editar", "Excluir", "Buscar"])
         
         with tab1:
             st.subheader("Visualizar e Editar Transações")
@@ -411,46 +656,26 @@ def main():
             with col3:
                 tipo_filtro = st.selectbox("Tipo", ["Todos", "entrada", "saida"], key="tipo_visualizar")
             
-            # Aplicar filtros
-            filtro_transacoes = transacoes.copy()
-            
-            # Filtrar por mês e ano
-            filtro_transacoes = filtro_transacoes[
-                (filtro_transacoes['data'].dt.month == mes_selecionado) & 
-                (filtro_transacoes['data'].dt.year == ano_selecionado)
-            ]
-            
-            # Filtrar por tipo
-            if tipo_filtro != "Todos":
-                filtro_transacoes = filtro_transacoes[filtro_transacoes['tipo'] == tipo_filtro]
-            
-            # Exibir resultados com opção de editar
-            if not filtro_transacoes.empty:
-                # Formatar para exibição
-                filtro_transacoes_formatadas = filtro_transacoes.copy()
-                filtro_transacoes_formatadas['data'] = filtro_transacoes_formatadas['data'].dt.strftime('%d/%m/%Y')
-                filtro_transacoes_formatadas['valor'] = filtro_transacoes_formatadas['valor'].apply(lambda x: f"R$ {x:.2f}")
-                
-                # Adicionar coluna com botão para editar
-                st.dataframe(filtro_transacoes_formatadas[['id', 'data', 'descricao', 'categoria', 'tipo', 'valor']], use_container_width=True)
-                
+            # Exibir resultados com opção de editar (filtro, ordenação e paginação feitos no banco)
+            if tabela_transacoes_mes(arquivo_banco, resumo, ano_selecionado, mes_selecionado, tipo_filtro,
+                                     versao, "visualizar"):
                 # Formulário para edição
                 st.subheader("Editar Transação")
                 id_editar = st.number_input("ID da Transação para Editar", min_value=1, 
-                                        max_value=int(transacoes['id'].max()) if not transacoes.empty else 1, 
+                                        max_value=max(armazenamento.maior_id(), 1), 
                                         step=1)
                 
-                if id_editar in transacoes['id'].values:
-                    transacao_atual = transacoes[transacoes['id'] == id_editar].iloc[0].to_dict()
-                    st.info(f"Editando transação: {transacao_atual['descricao']} - R$ {transacao_atual['valor']:.2f}")
+                # Busca pontual pela chave primária
+                transacao_atual = armazenamento.buscar_transacao(id_editar)
+                if transacao_atual is not None:
+                    st.info(f"Editando transação: {transacao_atual['descricao']} - R$ {para_reais(transacao_atual['valor_centavos']):.2f}")
                     
                     # Formulário preenchido com dados atuais
                     transacao_atualizada = form_transacao(categorias, dados_iniciais=transacao_atual)
                     
                     if st.button("Salvar Alterações"):
-                        if editar_transacao(id_editar, transacao_atualizada, arquivo_excel):
+                        if editar_transacao(id_editar, transacao_atualizada, arquivo_banco):
                             # Atualiza os dados após editar
-                            st.cache_data.clear()
                             st.rerun()
                 else:
                     st.warning("Selecione um ID válido para editar.")
@@ -471,48 +696,54 @@ def main():
             with col3:
                 tipo_filtro = st.selectbox("Tipo", ["Todos", "entrada", "saida"], key="tipo_excluir")
             
-            # Aplicar filtros
-            filtro_transacoes = transacoes.copy()
-            
-            # Filtrar por mês e ano
-            filtro_transacoes = filtro_transacoes[
-                (filtro_transacoes['data'].dt.month == mes_selecionado) & 
-                (filtro_transacoes['data'].dt.year == ano_selecionado)
-            ]
-            
-            # Filtrar por tipo
-            if tipo_filtro != "Todos":
-                filtro_transacoes = filtro_transacoes[filtro_transacoes['tipo'] == tipo_filtro]
-            
-            # Exibir resultados para exclusão
-            if not filtro_transacoes.empty:
-                # Formatar para exibição
-                filtro_transacoes_formatadas = filtro_transacoes.copy()
-                filtro_transacoes_formatadas['data'] = filtro_transacoes_formatadas['data'].dt.strftime('%d/%m/%Y')
-                filtro_transacoes_formatadas['valor'] = filtro_transacoes_formatadas['valor'].apply(lambda x: f"R$ {x:.2f}")
-                
-                st.dataframe(filtro_transacoes_formatadas[['id', 'data', 'descricao', 'categoria', 'tipo', 'valor']], use_container_width=True)
-                
+            # Exibir resultados para exclusão (filtro, ordenação e paginação feitos no banco)
+            if tabela_transacoes_mes(arquivo_banco, resumo, ano_selecionado, mes_selecionado, tipo_filtro,
+                                     versao, "excluir"):
                 # Formulário para exclusão
                 st.subheader("Excluir Transação")
                 id_excluir = st.number_input("ID da Transação para Excluir", min_value=1, 
-                                         max_value=int(transacoes['id'].max()) if not transacoes.empty else 1, 
+                                         max_value=max(armazenamento.maior_id(), 1), 
                                          step=1)
                 
-                if id_excluir in transacoes['id'].values:
-                    transacao_excluir = transacoes[transacoes['id'] == id_excluir].iloc[0]
-                    st.warning(f"Você está prestes a excluir: {transacao_excluir['descricao']} - R$ {transacao_excluir['valor']:.2f}")
+                transacao_excluir = armazenamento.buscar_transacao(id_excluir)
+                if transacao_excluir is not None:
+                    st.warning(f"Você está prestes a excluir: {transacao_excluir['descricao']} - R$ {para_reais(transacao_excluir['valor_centavos']):.2f}")
                     
                     # Confirmar exclusão
                     if st.button("Excluir Transação", type="primary"):
-                        if excluir_transacao(id_excluir, arquivo_excel):
+                        if excluir_transacao(id_excluir, arquivo_banco):
                             # Atualiza os dados após excluir
-                            st.cache_data.clear()
                             st.rerun()
                 else:
                     st.warning("Selecione um ID válido para excluir.")
             else:
                 st.info(f"Não há transações para {calendar.month_name[mes_selecionado]} de {ano_selecionado} com o filtro selecionado.")
+        
+        with tab3:
+            st.subheader("Buscar Transações")
+            
+            # Busca pela descrição em todo o histórico, usando o índice de trigramas do banco
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                termo = st.text_input("Descrição contém", key="termo_busca")
+            with col2:
+                tipo_busca = st.selectbox("Tipo", ["Todos", "entrada", "saida"], key="tipo_busca")
+            with col3:
+                aproximada = st.checkbox("Busca aproximada", key="busca_aproximada",
+                                         help="Encontra também descrições com pequenos erros de digitação")
+            
+            if termo.strip():
+                with etapa('carregar'):
+                    total, encontradas = buscar_transacoes(arquivo_banco, termo.strip(), aproximada, tipo_busca, versao)
+                if total:
+                    st.caption(f"{total} transações encontradas" +
+                               (f" (exibindo {len(encontradas)})" if total > len(encontradas) else ""))
+                    with etapa('renderizar'):
+                        encontradas_formatadas = formatar_para_exibicao(encontradas)
+                        st.dataframe(encontradas_formatadas[['id', 'data', 'descricao', 'categoria', 'tipo', 'valor']],
+                                     use_container_width=True, hide_index=True)
+                else:
+                    st.info(f"Nenhuma transação encontrada para '{termo.strip()}'.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,774 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+from exportacao import escrever_xlsx
+from modelo import COLUNAS_TRANSACOES, para_centavos, tipar_transacoes
+from recorrencias import expandir_recorrencias
+
+# Camada de armazenamento das transações.
+# O banco SQLite (em modo WAL) é a fonte primária dos dados: cada inclusão,
+# edição ou exclusão grava apenas a linha afetada e acrescenta um registro
+# no diário, sem reescrever o restante do histórico. A planilha Excel passa
+# a ser apenas uma exportação gerada sob demanda.
+
+COLUNAS_CATEGORIAS = ['tipo', 'categoria']
+COLUNAS_RESUMO = ['ano', 'mes', 'tipo', 'categoria', 'total_centavos', 'quantidade']
+COLUNAS_ORDENACAO = ['data', 'valor_centavos', 'descricao', 'categoria', 'id']
+
+CATEGORIAS_ENTRADAS = ['Salário', 'Investimentos', 'Freelance', 'Presente', 'Outros']
+CATEGORIAS_SAIDAS = ['Alimentação', 'Moradia', 'Transporte', 'Saúde', 'Educação',
+                     'Lazer', 'Vestuário', 'Contas', 'Compras', 'Outros']
+
+# Esquema inicial; as alterações posteriores ficam em MIGRACOES e são
+# aplicadas tanto a bancos novos quanto a bancos existentes
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transacoes (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    descricao TEXT NOT NULL,
+    valor REAL NOT NULL,
+    categoria TEXT NOT NULL,
+    tipo TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS categorias (
+    tipo TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    PRIMARY KEY (tipo, categoria)
+);
+
+-- Diário somente de acréscimo com todas as operações de escrita
+CREATE TABLE IF NOT EXISTS diario (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    operacao TEXT NOT NULL,
+    id_transacao INTEGER NOT NULL,
+    momento TEXT NOT NULL
+);
+"""
+
+# Migrações do esquema; o índice na lista + 1 é a versão do esquema
+# (PRAGMA user_version) após a migração
+MIGRACOES = [
+    # 1: IDs estáveis, nunca reutilizados após exclusões (AUTOINCREMENT)
+    """
+    CREATE TABLE transacoes_nova (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        descricao TEXT NOT NULL,
+        valor REAL NOT NULL,
+        categoria TEXT NOT NULL,
+        tipo TEXT NOT NULL
+    );
+    INSERT INTO transacoes_nova SELECT id, data, descricao, valor, categoria, tipo FROM transacoes;
+    DELETE FROM sqlite_sequence WHERE name = 'transacoes_nova';
+    INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'transacoes_nova', COALESCE(MAX(id_transacao), 0) FROM diario;
+    DROP TABLE transacoes;
+    ALTER TABLE transacoes_nova RENAME TO transacoes;
+    """,
+    # 2: Cubo de totais por (ano, mês, tipo, categoria), mantido por gatilhos
+    # a cada inclusão, edição ou exclusão
+    """
+    CREATE TABLE resumo (
+        ano INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        total REAL NOT NULL,
+        quantidade INTEGER NOT NULL,
+        PRIMARY KEY (ano, mes, tipo, categoria)
+    );
+
+    INSERT INTO resumo (ano, mes, tipo, categoria, total, quantidade)
+        SELECT CAST(substr(data, 1, 4) AS INTEGER), CAST(substr(data, 6, 2) AS INTEGER),
+               tipo, categoria, SUM(valor), COUNT(*)
+        FROM transacoes
+        GROUP BY 1, 2, 3, 4;
+
+    CREATE TRIGGER resumo_inserir AFTER INSERT ON transacoes BEGIN
+        INSERT INTO resumo (ano, mes, tipo, categoria, total, quantidade)
+            VALUES (CAST(substr(NEW.data, 1, 4) AS INTEGER), CAST(substr(NEW.data, 6, 2) AS INTEGER),
+                    NEW.tipo, NEW.categoria, NEW.valor, 1)
+            ON CONFLICT (ano, mes, tipo, categoria)
+            DO UPDATE SET total = total + excluded.total, quantidade = quantidade + 1;
+    END;
+
+    CREATE TRIGGER resumo_excluir AFTER DELETE ON transacoes BEGIN
+        UPDATE resumo SET total = total - OLD.valor, quantidade = quantidade - 1
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria;
+        DELETE FROM resumo
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria AND quantidade = 0;
+    END;
+
+    CREATE TRIGGER resumo_atualizar AFTER UPDATE ON transacoes BEGIN
+        UPDATE resumo SET total = total - OLD.valor, quantidade = quantidade - 1
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria;
+        DELETE FROM resumo
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria AND quantidade = 0;
+        INSERT INTO resumo (ano, mes, tipo, categoria, total, quantidade)
+            VALUES (CAST(substr(NEW.data, 1, 4) AS INTEGER), CAST(substr(NEW.data, 6, 2) AS INTEGER),
+                    NEW.tipo, NEW.categoria, NEW.valor, 1)
+            ON CONFLICT (ano, mes, tipo, categoria)
+            DO UPDATE SET total = total + excluded.total, quantidade = quantidade + 1;
+    END;
+    """,
+    # 3: Valores em centavos inteiros, eliminando erros de arredondamento nos totais
+    """
+    CREATE TABLE transacoes_nova (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        descricao TEXT NOT NULL,
+        valor_centavos INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        tipo TEXT NOT NULL
+    );
+    INSERT INTO transacoes_nova
+        SELECT id, data, descricao, CAST(ROUND(valor * 100) AS INTEGER), categoria, tipo FROM transacoes;
+    DELETE FROM sqlite_sequence WHERE name = 'transacoes_nova';
+    UPDATE sqlite_sequence SET name = 'transacoes_nova' WHERE name = 'transacoes';
+    DROP TABLE transacoes;
+    ALTER TABLE transacoes_nova RENAME TO transacoes;
+
+    DROP TABLE resumo;
+    CREATE TABLE resumo (
+        ano INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        total_centavos INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        PRIMARY KEY (ano, mes, tipo, categoria)
+    );
+
+    INSERT INTO resumo (ano, mes, tipo, categoria, total_centavos, quantidade)
+        SELECT CAST(substr(data, 1, 4) AS INTEGER), CAST(substr(data, 6, 2) AS INTEGER),
+               tipo, categoria, SUM(valor_centavos), COUNT(*)
+        FROM transacoes
+        GROUP BY 1, 2, 3, 4;
+
+    CREATE TRIGGER resumo_inserir AFTER INSERT ON transacoes BEGIN
+        INSERT INTO resumo (ano, mes, tipo, categoria, total_centavos, quantidade)
+            VALUES (CAST(substr(NEW.data, 1, 4) AS INTEGER), CAST(substr(NEW.data, 6, 2) AS INTEGER),
+                    NEW.tipo, NEW.categoria, NEW.valor_centavos, 1)
+            ON CONFLICT (ano, mes, tipo, categoria)
+            DO UPDATE SET total_centavos = total_centavos + excluded.total_centavos, quantidade = quantidade + 1;
+    END;
+
+    CREATE TRIGGER resumo_excluir AFTER DELETE ON transacoes BEGIN
+        UPDATE resumo SET total_centavos = total_centavos - OLD.valor_centavos, quantidade = quantidade - 1
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria;
+        DELETE FROM resumo
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria AND quantidade = 0;
+    END;
+
+    CREATE TRIGGER resumo_atualizar AFTER UPDATE ON transacoes BEGIN
+        UPDATE resumo SET total_centavos = total_centavos - OLD.valor_centavos, quantidade = quantidade - 1
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria;
+        DELETE FROM resumo
+            WHERE ano = CAST(substr(OLD.data, 1, 4) AS INTEGER) AND mes = CAST(substr(OLD.data, 6, 2) AS INTEGER)
+              AND tipo = OLD.tipo AND categoria = OLD.categoria AND quantidade = 0;
+        INSERT INTO resumo (ano, mes, tipo, categoria, total_centavos, quantidade)
+            VALUES (CAST(substr(NEW.data, 1, 4) AS INTEGER), CAST(substr(NEW.data, 6, 2) AS INTEGER),
+                    NEW.tipo, NEW.categoria, NEW.valor_centavos, 1)
+            ON CONFLICT (ano, mes, tipo, categoria)
+            DO UPDATE SET total_centavos = total_centavos + excluded.total_centavos, quantidade = quantidade + 1;
+    END;
+    """,
+    # 4: Índice por data, que particiona as leituras por período (mês/ano)
+    """
+    CREATE INDEX transacoes_por_data ON transacoes (data);
+    """,
+    # 5: Hashes do conteúdo das linhas já importadas de extratos bancários,
+    # usados para descartar duplicatas em importações repetidas
+    """
+    CREATE TABLE importadas (
+        hash TEXT PRIMARY KEY,
+        id_transacao INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    # 6: Índice de trigramas das descrições (FTS5), para busca por trecho em
+    # todo o histórico; mantido por gatilhos a cada inclusão, edição ou exclusão
+    """
+    CREATE VIRTUAL TABLE busca USING fts5(
+        descricao, content='transacoes', content_rowid='id', tokenize='trigram'
+    );
+    INSERT INTO busca (busca) VALUES ('rebuild');
+
+    CREATE TRIGGER busca_inserir AFTER INSERT ON transacoes BEGIN
+        INSERT INTO busca (rowid, descricao) VALUES (NEW.id, NEW.descricao);
+    END;
+
+    CREATE TRIGGER busca_excluir AFTER DELETE ON transacoes BEGIN
+        INSERT INTO busca (busca, rowid, descricao) VALUES ('delete', OLD.id, OLD.descricao);
+    END;
+
+    CREATE TRIGGER busca_atualizar AFTER UPDATE OF descricao ON transacoes BEGIN
+        INSERT INTO busca (busca, rowid, descricao) VALUES ('delete', OLD.id, OLD.descricao);
+        INSERT INTO busca (rowid, descricao) VALUES (NEW.id, NEW.descricao);
+    END;
+    """,
+    # 7: Regras de transações recorrentes; ultima_lancada é a data até a qual
+    # as ocorrências já foram lançadas no livro-caixa
+    """
+    CREATE TABLE recorrentes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        descricao TEXT NOT NULL,
+        valor_centavos INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        frequencia TEXT NOT NULL CHECK (frequencia IN ('semanal', 'mensal', 'anual')),
+        intervalo INTEGER NOT NULL DEFAULT 1 CHECK (intervalo >= 1),
+        inicio TEXT NOT NULL,
+        fim TEXT,
+        ultima_lancada TEXT
+    );
+    """,
+    # 8: Descrição, tipo e categoria anteriores das transações editadas ou
+    # excluídas, para aplicar as alterações a contagens já agregadas
+    """
+    ALTER TABLE diario ADD COLUMN descricao_anterior TEXT;
+    ALTER TABLE diario ADD COLUMN tipo_anterior TEXT;
+    ALTER TABLE diario ADD COLUMN categoria_anterior TEXT;
+    """,
+    # 9: Etapas únicas já concluídas (como a importação da planilha antiga).
+    # Bancos que já têm operações no diário são anteriores a esta migração e
+    # já passaram pela importação da planilha.
+    """
+    CREATE TABLE etapas (
+        nome TEXT PRIMARY KEY,
+        momento TEXT NOT NULL
+    );
+    INSERT INTO etapas (nome, momento)
+        SELECT 'importar_planilha', datetime('now', 'localtime') WHERE EXISTS (SELECT 1 FROM diario);
+    """,
+]
+VERSAO_ESQUEMA = len(MIGRACOES)
+
+# Quantidade de parâmetros por consulta "IN (...)", abaixo do limite do SQLite
+PARAMETROS_POR_CONSULTA = 900
+
+# Linhas lidas por vez nas leituras em blocos (exportação)
+TAMANHO_BLOCO_LEITURA = 10_000
+
+# Etapa registrada após a importação da planilha antiga (financas.xlsx)
+ETAPA_PLANILHA = 'importar_planilha'
+
+# Busca aproximada: candidatos avaliados e fração mínima dos trigramas do
+# termo que a descrição precisa conter
+CANDIDATOS_BUSCA = 5000
+SEMELHANCA_MINIMA = 0.5
+
+
+def transacoes_vazias():
+    return tipar_transacoes(pd.DataFrame({coluna: [] for coluna in COLUNAS_TRANSACOES}))
+
+
+def categorias_vazias():
+    return pd.DataFrame({coluna: [] for coluna in COLUNAS_CATEGORIAS})
+
+
+def resumo_vazio():
+    return pd.DataFrame({coluna: [] for coluna in COLUNAS_RESUMO})
+
+
+# Converte uma transação vinda do formulário para os valores gravados no banco
+def _valores_transacao(transacao):
+    return (
+        pd.to_datetime(transacao['data']).strftime('%Y-%m-%d'),
+        str(transacao['descricao']),
+        para_centavos(transacao['valor']),
+        str(transacao['categoria']),
+        str(transacao['tipo']),
+    )
+
+
+# Versão vetorizada de _valores_transacao para um DataFrame inteiro
+def _linhas_transacoes(transacoes):
+    return zip(
+        pd.to_datetime(transacoes['data']).dt.strftime('%Y-%m-%d'),
+        transacoes['descricao'].astype(str),
+        (pd.to_numeric(transacoes['valor']) * 100).round().astype('int64').tolist(),
+        transacoes['categoria'].astype(str),
+        transacoes['tipo'].astype(str),
+    )
+
+
+# Trigramas (trechos de 3 caracteres) de um texto, sem distinguir maiúsculas
+def _trigramas(texto):
+    texto = texto.lower()
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Maior ID já atribuído, inclusive de transações excluídas
+def _ultimo_id(conn):
+    linha = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transacoes'").fetchone()
+    return linha[0] if linha else 0
+
+
+# Condição SQL (e parâmetros) para transações com data em [inicio, fim) e do tipo informado
+def _filtro_periodo(inicio, fim, tipo=None):
+    condicao = 'data >= ? AND data < ?'
+    parametros = [pd.Timestamp(inicio).strftime('%Y-%m-%d'), pd.Timestamp(fim).strftime('%Y-%m-%d')]
+    if tipo is not None:
+        condicao += ' AND tipo = ?'
+        parametros.append(tipo)
+    return condicao, parametros
+
+
+class Armazenamento:
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        novo = not os.path.exists(arquivo)
+
+        with self._conectar() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            if novo:
+                conn.executescript(SCHEMA)
+                conn.executemany(
+                    'INSERT INTO categorias (tipo, categoria) VALUES (?, ?)',
+                    [('entrada', c) for c in CATEGORIAS_ENTRADAS] +
+                    [('saida', c) for c in CATEGORIAS_SAIDAS])
+            self._migrar(conn)
+
+        self.criado = novo
+        # Importação da planilha antiga já concluída (lembrada para não consultar o banco a cada execução)
+        self.planilha_importada = False
+
+    def _migrar(self, conn):
+        versao = conn.execute('PRAGMA user_version').fetchone()[0]
+        for numero, script in enumerate(MIGRACOES[versao:], start=versao + 1):
+            conn.executescript(f'BEGIN; {script}; PRAGMA user_version = {numero}; COMMIT;')
+
+    # Abre uma conexão curta; o bloco inteiro roda em uma única transação
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.arquivo, timeout=30)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # `anterior` é a (descricao, tipo, categoria) da transação antes de uma edição ou exclusão
+    def _registrar(self, conn, operacao, id_transacao, anterior=(None, None, None)):
+        conn.execute(
+            'INSERT INTO diario (operacao, id_transacao, momento, descricao_anterior, tipo_anterior, '
+            'categoria_anterior) VALUES (?, ?, ?, ?, ?, ?)',
+            (operacao, id_transacao, datetime.now().isoformat(timespec='seconds')) + tuple(anterior))
+
+    # Leitura
+
+    def carregar_transacoes(self):
+        return self.carregar_transacoes_versionadas()[1]
+
+    # Transações e a versão dos dados lidas na mesma transação do banco
+    def carregar_transacoes_versionadas(self):
+        with self._conectar() as conn:
+            conn.execute('BEGIN')
+            versao = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM diario').fetchone()[0]
+            transacoes = pd.read_sql_query(
+                'SELECT id, data, descricao, valor_centavos, categoria, tipo FROM transacoes', conn)
+        return versao, tipar_transacoes(transacoes)
+
+    # Uma página das transações do período, filtrada, ordenada e recortada no
+    # banco; só as linhas da página são lidas e convertidas
+    def carregar_pagina(self, inicio, fim, tipo=None, ordenar_por='data', decrescente=False,
+                        limite=50, deslocamento=0):
+        if ordenar_por not in COLUNAS_ORDENACAO:
+            raise ValueError(f"Não é possível ordenar por '{ordenar_por}'.")
+
+        condicao, parametros = _filtro_periodo(inicio, fim, tipo)
+        direcao = 'DESC' if decrescente else 'ASC'
+        with self._conectar() as conn:
+            transacoes = pd.read_sql_query(
+                f'SELECT id, data, descricao, valor_centavos, categoria, tipo FROM transacoes WHERE {condicao} '
+                f'ORDER BY {ordenar_por} {direcao}, id {direcao} LIMIT ? OFFSET ?',
+                conn, params=parametros + [int(limite), int(deslocamento)])
+        return tipar_transacoes(transacoes, ordenar_por_data=False)
+
+    # Transações em blocos de `tamanho_bloco` linhas, em ordem de data, com os
+    # filtros opcionais de período [inicio, fim), tipo e categoria. As colunas
+    # vêm como gravadas no banco (data em texto aaaa-mm-dd). Todos os blocos são
+    # lidos por uma única consulta, sobre a mesma versão dos dados, e a memória
+    # usada não depende do tamanho do livro-caixa.
+    def iterar_transacoes(self, inicio=None, fim=None, tipo=None, categoria=None,
+                          tamanho_bloco=TAMANHO_BLOCO_LEITURA):
+        condicoes, parametros = ['1 = 1'], []
+        if inicio is not None:
+            condicoes.append('data >= ?')
+            parametros.append(pd.Timestamp(inicio).strftime('%Y-%m-%d'))
+        if fim is not None:
+            condicoes.append('data < ?')
+            parametros.append(pd.Timestamp(fim).strftime('%Y-%m-%d'))
+        if tipo is not None:
+            condicoes.append('tipo = ?')
+            parametros.append(tipo)
+        if categoria is not None:
+            condicoes.append('categoria = ?')
+            parametros.append(categoria)
+
+        with self._conectar() as conn:
+            yield from pd.read_sql_query(
+                f"SELECT id, data, descricao, valor_centavos, categoria, tipo FROM transacoes "
+                f"WHERE {' AND '.join(condicoes)} ORDER BY data, id",
+                conn, params=parametros, chunksize=tamanho_bloco)
+
+    def maior_id(self):
+        with self._conectar() as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM transacoes').fetchone()[0]
+
+    def buscar_transacao(self, id_transacao):
+        with self._conectar() as conn:
+            conn.row_factory = sqlite3.Row
+            linha = conn.execute(
+                'SELECT id, data, descricao, valor_centavos, categoria, tipo FROM transacoes WHERE id = ?',
+                (int(id_transacao),)).fetchone()
+        if linha is None:
+            return None
+        transacao = dict(linha)
+        transacao['data'] = pd.to_datetime(transacao['data'])
+        return transacao
+
+    # Busca pelo trecho em todas as descrições, usando o índice de trigramas.
+    # Com aproximada=True aceita erros de digitação: as descrições que contêm
+    # pelo menos SEMELHANCA_MINIMA dos trigramas do termo são ordenadas pela
+    # semelhança. Devolve o total encontrado e até `limite` transações (as
+    # mais recentes primeiro, na busca exata).
+    def buscar_transacoes(self, termo, aproximada=False, tipo=None, limite=200):
+        termo = termo.strip()
+        filtro_tipo, parametros_tipo = ('AND t.tipo = ?', [tipo]) if tipo is not None else ('', [])
+        colunas = 't.id, t.data, t.descricao, t.valor_centavos, t.categoria, t.tipo'
+
+        with self._conectar() as conn:
+            trigramas = _trigramas(termo)
+            if not aproximada or not trigramas:
+                if trigramas:
+                    # Com o tokenizador de trigramas, uma frase entre aspas casa com
+                    # qualquer descrição que contenha o trecho
+                    condicao = f'b.busca MATCH ? {filtro_tipo}'
+                    parametros = ['"' + termo.replace('"', '""') + '"'] + parametros_tipo
+                else:
+                    # Trechos com menos de 3 caracteres não usam o índice
+                    padrao = '%' + termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                    condicao = f"b.descricao LIKE ? ESCAPE '\\' {filtro_tipo}"
+                    parametros = [padrao] + parametros_tipo
+                total = conn.execute(
+                    f'SELECT COUNT(*) FROM busca b JOIN transacoes t ON t.id = b.rowid WHERE {condicao}',
+                    parametros).fetchone()[0]
+                transacoes = pd.read_sql_query(
+                    f'SELECT {colunas} FROM busca b JOIN transacoes t ON t.id = b.rowid WHERE {condicao} '
+                    'ORDER BY t.data DESC, t.id DESC LIMIT ?', conn, params=parametros + [int(limite)])
+                return total, tipar_transacoes(transacoes, ordenar_por_data=False)
+
+            # Candidatos com qualquer trigrama do termo, os mais relevantes primeiro
+            consulta = ' OR '.join('"' + trigrama.replace('"', '""') + '"' for trigrama in trigramas)
+            candidatos = pd.read_sql_query(
+                f'SELECT {colunas} FROM busca b JOIN transacoes t ON t.id = b.rowid '
+                f'WHERE b.busca MATCH ? {filtro_tipo} ORDER BY b.rank LIMIT ?',
+                conn, params=[consulta] + parametros_tipo + [CANDIDATOS_BUSCA])
+
+        semelhanca = candidatos['descricao'].map(
+            lambda descricao: len(trigramas & _trigramas(descricao)) / len(trigramas))
+        encontradas = candidatos.assign(semelhanca=semelhanca)[semelhanca >= SEMELHANCA_MINIMA]
+        encontradas = encontradas.sort_values(['semelhanca', 'data', 'id'], ascending=False, kind='stable')
+        return len(encontradas), tipar_transacoes(encontradas.head(limite).drop(columns='semelhanca'),
+                                                  ordenar_por_data=False)
+
+    # Versão dos dados: número de sequência da última operação registrada no diário
+    def versao(self):
+        with self._conectar() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM diario').fetchone()[0]
+
+    # Transações alteradas depois da versão informada: devolve a versão atual,
+    # os IDs afetados e o estado atual das que ainda existem, lidos na mesma
+    # transação do banco
+    def alteracoes_desde(self, versao):
+        with self._conectar() as conn:
+            conn.execute('BEGIN')
+            versao_atual = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM diario').fetchone()[0]
+            ids = [linha[0] for linha in conn.execute(
+                'SELECT DISTINCT id_transacao FROM diario WHERE seq > ? AND seq <= ?', (versao, versao_atual))]
+            atuais = pd.read_sql_query(
+                'SELECT id, data, descricao, valor_centavos, categoria, tipo FROM transacoes '
+                'WHERE id IN (SELECT id_transacao FROM diario WHERE seq > ? AND seq <= ?)',
+                conn, params=(versao, versao_atual))
+        return versao_atual, ids, tipar_transacoes(atuais)
+
+    # Quantidade de transações de cada (descricao, tipo, categoria), sem ler o
+    # livro-caixa inteiro; devolve (versao, contagens). A versão e as contagens
+    # são lidas na mesma transação.
+    def carregar_contagens_descricoes(self):
+        with self._conectar() as conn:
+            conn.execute('BEGIN')
+            versao = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM diario').fetchone()[0]
+            contagens = pd.read_sql_query(
+                'SELECT descricao, tipo, categoria, COUNT(*) AS quantidade FROM transacoes '
+                'GROUP BY descricao, tipo, categoria', conn)
+        return versao, contagens
+
+    # Alterações das contagens por (descricao, tipo, categoria) depois da versão
+    # informada: devolve (versao_atual, removidas, adicionadas). Cada transação
+    # alterada sai com os valores que tinha naquela versão (os anteriores da
+    # sua primeira entrada no diário, se não foi incluída depois dela) e entra
+    # com os atuais, se ainda existir.
+    def alteracoes_descricoes_desde(self, versao):
+        with self._conectar() as conn:
+            conn.execute('BEGIN')
+            versao_atual = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM diario').fetchone()[0]
+            removidas = pd.read_sql_query(
+                'SELECT descricao_anterior AS descricao, tipo_anterior AS tipo, categoria_anterior AS categoria, '
+                'COUNT(*) AS quantidade FROM diario '
+                'WHERE seq IN (SELECT MIN(seq) FROM diario WHERE seq > ? AND seq <= ? GROUP BY id_transacao) '
+                "AND operacao != 'inserir' AND descricao_anterior IS NOT NULL "
+                'GROUP BY 1, 2, 3',
+                conn, params=(versao, versao_atual))
+            adicionadas = pd.read_sql_query(
+                'SELECT descricao, tipo, categoria, COUNT(*) AS quantidade FROM transacoes '
+                'WHERE id IN (SELECT id_transacao FROM diario WHERE seq > ? AND seq <= ?) '
+                'GROUP BY descricao, tipo, categoria',
+                conn, params=(versao, versao_atual))
+        return versao_atual, removidas, adicionadas
+
+    # Totais por mês, tipo e categoria; o tamanho independe do número de transações
+    def carregar_resumo(self):
+        with self._conectar() as conn:
+            return pd.read_sql_query(
+                'SELECT ano, mes, tipo, categoria, total_centavos, quantidade FROM resumo ORDER BY ano, mes', conn)
+
+    def carregar_recorrentes(self):
+        with self._conectar() as conn:
+            return pd.read_sql_query(
+                'SELECT id, descricao, valor_centavos, categoria, tipo, frequencia, intervalo, inicio, fim, '
+                'ultima_lancada FROM recorrentes ORDER BY id', conn)
+
+    def carregar_categorias(self):
+        with self._conectar() as conn:
+            return pd.read_sql_query('SELECT tipo, categoria FROM categorias', conn)
+
+    # Escrita
+
+    def _inserir(self, conn, transacao):
+        cursor = conn.execute(
+            'INSERT INTO transacoes (data, descricao, valor_centavos, categoria, tipo) VALUES (?, ?, ?, ?, ?)',
+            _valores_transacao(transacao))
+        self._registrar(conn, 'inserir', cursor.lastrowid)
+        return cursor.lastrowid
+
+    def _anterior(self, conn, id_transacao):
+        return conn.execute('SELECT descricao, tipo, categoria FROM transacoes WHERE id = ?',
+                            (id_transacao,)).fetchone()
+
+    def _atualizar(self, conn, id_transacao, transacao):
+        anterior = self._anterior(conn, int(id_transacao))
+        if anterior is None:
+            return False
+        conn.execute(
+            'UPDATE transacoes SET data = ?, descricao = ?, valor_centavos = ?, categoria = ?, tipo = ? WHERE id = ?',
+            _valores_transacao(transacao) + (int(id_transacao),))
+        self._registrar(conn, 'atualizar', int(id_transacao), anterior)
+        return True
+
+    def _excluir(self, conn, id_transacao):
+        anterior = self._anterior(conn, int(id_transacao))
+        if anterior is None:
+            return False
+        conn.execute('DELETE FROM transacoes WHERE id = ?', (int(id_transacao),))
+        self._registrar(conn, 'excluir', int(id_transacao), anterior)
+        return True
+
+    def _inserir_recorrente(self, conn, regra):
+        fim = regra.get('fim')
+        cursor = conn.execute(
+            'INSERT INTO recorrentes (descricao, valor_centavos, categoria, tipo, frequencia, intervalo, inicio, fim) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (str(regra['descricao']), para_centavos(regra['valor']), str(regra['categoria']), str(regra['tipo']),
+             str(regra['frequencia']), int(regra.get('intervalo', 1)),
+             pd.to_datetime(regra['inicio']).strftime('%Y-%m-%d'),
+             None if fim is None or pd.isna(fim) else pd.to_datetime(fim).strftime('%Y-%m-%d')))
+        return cursor.lastrowid
+
+    # As ocorrências já lançadas continuam no livro-caixa
+    def _excluir_recorrente(self, conn, id_regra):
+        return conn.execute('DELETE FROM recorrentes WHERE id = ?', (int(id_regra),)).rowcount > 0
+
+    # Lança no livro-caixa as ocorrências com data até `ate` que ainda não foram
+    # lançadas; devolve os IDs das transações criadas
+    def _lancar_recorrentes(self, conn, ate):
+        ate = pd.Timestamp(ate).strftime('%Y-%m-%d')
+        regras = pd.read_sql_query(
+            'SELECT id, descricao, valor_centavos, categoria, tipo, frequencia, intervalo, inicio, fim, '
+            'ultima_lancada FROM recorrentes WHERE inicio <= ? AND (ultima_lancada IS NULL OR ultima_lancada < ?)',
+            conn, params=(ate, ate))
+        if regras.empty:
+            return []
+
+        desde = pd.to_datetime(regras['ultima_lancada']) + pd.Timedelta(days=1)
+        ocorrencias = expandir_recorrencias(regras, ate, desde)
+        ids = []
+        if not ocorrencias.empty:
+            ids = self._inserir_varias(conn, ocorrencias.assign(valor=ocorrencias['valor_centavos'] / 100))
+        conn.executemany('UPDATE recorrentes SET ultima_lancada = ? WHERE id = ?',
+                         ((ate, int(id_regra)) for id_regra in regras['id']))
+        return ids
+
+    def inserir_transacao(self, transacao):
+        with self._conectar() as conn:
+            return self._inserir(conn, transacao)
+
+    def _inserir_varias(self, conn, transacoes):
+        primeiro = _ultimo_id(conn) + 1
+        conn.executemany(
+            'INSERT INTO transacoes (data, descricao, valor_centavos, categoria, tipo) VALUES (?, ?, ?, ?, ?)',
+            _linhas_transacoes(transacoes))
+        ids = list(range(primeiro, _ultimo_id(conn) + 1))
+        momento = datetime.now().isoformat(timespec='seconds')
+        conn.executemany(
+            'INSERT INTO diario (operacao, id_transacao, momento) VALUES (?, ?, ?)',
+            (('inserir', id_transacao, momento) for id_transacao in ids))
+        return ids
+
+    # Insere as linhas importadas (com a coluna hash) cujo hash ainda não foi
+    # visto; devolve os IDs gerados
+    def _importar(self, conn, transacoes):
+        hashes = transacoes['hash'].tolist()
+        existentes = set()
+        for inicio in range(0, len(hashes), PARAMETROS_POR_CONSULTA):
+            parte = hashes[inicio:inicio + PARAMETROS_POR_CONSULTA]
+            existentes.update(linha[0] for linha in conn.execute(
+                f"SELECT hash FROM importadas WHERE hash IN ({', '.join('?' * len(parte))})", parte))
+
+        novas = transacoes[~transacoes['hash'].isin(existentes)].drop_duplicates('hash')
+        if novas.empty:
+            return []
+        ids = self._inserir_varias(conn, novas)
+        conn.executemany('INSERT INTO importadas (hash, id_transacao) VALUES (?, ?)', zip(novas['hash'], ids))
+        return ids
+
+    # Insere muitas transações (DataFrame com data, descricao, valor em reais,
+    # categoria e tipo) em uma única transação do banco; devolve os IDs gerados
+    def inserir_transacoes(self, transacoes):
+        with self._conectar() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return self._inserir_varias(conn, transacoes)
+
+    # Como inserir_transacoes, para linhas de extratos com a coluna hash:
+    # as já importadas antes são descartadas
+    def importar_transacoes(self, transacoes):
+        with self._conectar() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return self._importar(conn, transacoes)
+
+    def atualizar_transacao(self, id_transacao, transacao):
+        with self._conectar() as conn:
+            return self._atualizar(conn, id_transacao, transacao)
+
+    def excluir_transacao(self, id_transacao):
+        with self._conectar() as conn:
+            return self._excluir(conn, id_transacao)
+
+    # Aplica várias operações ('inserir', 'atualizar', 'excluir', 'inserir_varias',
+    # 'importar', 'inserir_recorrente', 'excluir_recorrente' ou 'lancar_recorrentes',
+    # com seus argumentos) em uma única transação do banco. Cada operação roda em um
+    # savepoint: a falha de uma é devolvida como exceção na sua posição da
+    # lista de resultados, sem desfazer as demais.
+    def aplicar_lote(self, operacoes):
+        funcoes = {'inserir': self._inserir, 'atualizar': self._atualizar, 'excluir': self._excluir,
+                   'inserir_varias': self._inserir_varias, 'importar': self._importar,
+                   'inserir_recorrente': self._inserir_recorrente, 'excluir_recorrente': self._excluir_recorrente,
+                   'lancar_recorrentes': self._lancar_recorrentes}
+        resultados = []
+
+        with self._conectar() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for operacao, argumentos in operacoes:
+                conn.execute('SAVEPOINT operacao')
+                try:
+                    resultado = funcoes[operacao](conn, *argumentos)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operacao')
+                    resultado = e
+                conn.execute('RELEASE operacao')
+                resultados.append(resultado)
+        return resultados
+
+    # Importação/exportação da planilha Excel
+
+    # Importa a planilha; devolve a quantidade de linhas importadas e a de
+    # inválidas (sem data, valor, descrição ou categoria, ou com tipo
+    # desconhecido), que são descartadas
+    def importar_excel(self, arquivo_excel):
+        with self._conectar() as conn:
+            return self._importar_excel(conn, arquivo_excel)
+
+    # Migra a planilha antiga para o banco uma única vez. A etapa só é
+    # registrada junto com a importação: se ela falhar, é tentada de novo na
+    # próxima execução. Devolve o resultado de importar_excel, ou None se a
+    # etapa já foi concluída ou se a planilha não existe.
+    def importar_planilha_antiga(self, arquivo_excel):
+        if self.planilha_importada:
+            return None
+        with self._conectar() as conn:
+            # Consulta sem trava primeiro: depois da importação, nenhuma
+            # execução precisa esperar pelas gravações em andamento
+            if not self._etapa_concluida(conn, ETAPA_PLANILHA):
+                # Trava de escrita e nova consulta, para que só uma sessão importe
+                conn.execute('BEGIN IMMEDIATE')
+                if not self._etapa_concluida(conn, ETAPA_PLANILHA):
+                    resultado = self._importar_excel(conn, arquivo_excel) if os.path.exists(arquivo_excel) else None
+                    conn.execute('INSERT INTO etapas (nome, momento) VALUES (?, ?)',
+                                 (ETAPA_PLANILHA, datetime.now().isoformat(timespec='seconds')))
+                    conn.commit()
+                    self.planilha_importada = True
+                    return resultado
+        self.planilha_importada = True
+        return None
+
+    def _etapa_concluida(self, conn, nome):
+        return conn.execute('SELECT 1 FROM etapas WHERE nome = ?', (nome,)).fetchone() is not None
+
+    def _importar_excel(self, conn, arquivo_excel):
+        transacoes = pd.read_excel(arquivo_excel, sheet_name='Transacoes')
+        categorias = pd.read_excel(arquivo_excel, sheet_name='Categorias')
+
+        datas = pd.to_datetime(transacoes['data'], errors='coerce')
+        valores = pd.to_numeric(transacoes['valor'], errors='coerce')
+        validas = (datas.notna() & valores.notna() & (valores.abs() < float('inf')) &
+                   transacoes['descricao'].notna() & transacoes['categoria'].notna() &
+                   transacoes['tipo'].isin(['entrada', 'saida']))
+        # Preservar o ID da planilha quando existir e não estiver em uso
+        ids = pd.to_numeric(transacoes.reindex(columns=['id'])['id'], errors='coerce')
+        em_uso = pd.read_sql_query('SELECT id FROM transacoes', conn)['id']
+        ids = ids.where(~ids.duplicated() & ~ids.isin(em_uso))
+        validas_df = transacoes[validas].assign(data=datas[validas], valor=valores[validas])
+
+        if not categorias.empty:
+            conn.executemany(
+                'INSERT OR IGNORE INTO categorias (tipo, categoria) VALUES (?, ?)',
+                categorias[COLUNAS_CATEGORIAS].dropna().itertuples(index=False, name=None))
+        for id_transacao, valores_transacao in zip(ids[validas].tolist(), _linhas_transacoes(validas_df)):
+            cursor = conn.execute(
+                'INSERT INTO transacoes (id, data, descricao, valor_centavos, categoria, tipo) VALUES (?, ?, ?, ?, ?, ?)',
+                (None if pd.isna(id_transacao) else int(id_transacao),) + tuple(valores_transacao))
+            self._registrar(conn, 'inserir', cursor.lastrowid)
+        return {'importadas': int(validas.sum()), 'invalidas': int((~validas).sum())}
+
+    # Planilha completa, no mesmo formato aceito por importar_excel (valor em
+    # reais). As linhas são gravadas em blocos, no modo somente escrita do
+    # openpyxl; só o arquivo compactado fica em memória.
+    def exportar_excel(self):
+        buffer = BytesIO()
+        escrever_xlsx(self.iterar_transacoes(), buffer, self.carregar_categorias())
+        return buffer.getvalue()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from armazenamento import CATEGORIAS_ENTRADAS, CATEGORIAS_SAIDAS
+
+# Gerador de livros-caixa sintéticos para os benchmarks.
+# Produz transações com distribuição parecida com a de um uso real: poucas
+# entradas grandes (salário no início do mês) e muitas saídas pequenas,
+# espalhadas pelas categorias padrão.
+
+# Categoria: (peso relativo, mediana do valor em reais, descrições típicas)
+PERFIL_ENTRADAS = {
+    'Salário': (6, 5000.0, ['Salário', 'Adiantamento salarial']),
+    'Investimentos': (2, 300.0, ['Dividendos', 'Rendimento CDB', 'Resgate fundo']),
+    'Freelance': (2, 1200.0, ['Projeto freelance', 'Consultoria']),
+    'Presente': (1, 200.0, ['Presente aniversário', 'Pix recebido']),
+    'Outros': (1, 150.0, ['Reembolso', 'Venda usado']),
+}
+PERFIL_SAIDAS = {
+    'Alimentação': (30, 60.0, ['Supermercado', 'Padaria', 'iFood', 'Restaurante']),
+    'Moradia': (4, 1500.0, ['Aluguel', 'Condomínio', 'IPTU']),
+    'Transporte': (20, 25.0, ['Uber', '99', 'Combustível', 'Estacionamento']),
+    'Saúde': (5, 120.0, ['Farmácia', 'Consulta', 'Plano de saúde']),
+    'Educação': (3, 400.0, ['Mensalidade', 'Livros', 'Curso online']),
+    'Lazer': (10, 80.0, ['Cinema', 'Netflix', 'Show', 'Bar']),
+    'Vestuário': (5, 150.0, ['Roupas', 'Calçados']),
+    'Contas': (8, 180.0, ['Conta de luz', 'Conta de água', 'Fatura internet', 'Fatura celular']),
+    'Compras': (10, 100.0, ['Amazon', 'Mercado Livre', 'Loja']),
+    'Outros': (5, 50.0, ['Diversos', 'Pix enviado']),
+}
+
+# Fração das transações que são entradas
+FRACAO_ENTRADAS = 0.12
+
+assert set(PERFIL_ENTRADAS) == set(CATEGORIAS_ENTRADAS)
+assert set(PERFIL_SAIDAS) == set(CATEGORIAS_SAIDAS)
+
+
+def _amostrar_tipo(gerador, quantidade, tipo, perfil):
+    categorias = list(perfil)
+    pesos = np.array([perfil[c][0] for c in categorias], dtype=float)
+    indices = gerador.choice(len(categorias), size=quantidade, p=pesos / pesos.sum())
+
+    medianas = np.array([perfil[c][1] for c in categorias])[indices]
+    valores = np.round(medianas * gerador.lognormal(0.0, 0.6, size=quantidade), 2)
+    valores = np.maximum(valores, 0.01)
+
+    # Descrição sorteada entre as típicas da categoria (sem laço por linha)
+    descricoes = np.empty(quantidade, dtype=object)
+    for i, categoria in enumerate(categorias):
+        selecionadas = indices == i
+        opcoes = np.array(perfil[categoria][2], dtype=object)
+        descricoes[selecionadas] = opcoes[gerador.integers(0, len(opcoes), size=selecionadas.sum())]
+
+    return pd.DataFrame({
+        'descricao': descricoes,
+        'valor': valores,
+        'categoria': np.array(categorias, dtype=object)[indices],
+        'tipo': tipo,
+    })
+
+
+# Gera `quantidade` transações entre `inicio` e `fim`, ordenadas por data
+def gerar_transacoes(quantidade, inicio='2015-01-01', fim='2025-12-31', semente=42):
+    gerador = np.random.default_rng(semente)
+    quantidade_entradas = int(round(quantidade * FRACAO_ENTRADAS))
+
+    transacoes = pd.concat([
+        _amostrar_tipo(gerador, quantidade_entradas, 'entrada', PERFIL_ENTRADAS),
+        _amostrar_tipo(gerador, quantidade - quantidade_entradas, 'saida', PERFIL_SAIDAS),
+    ], ignore_index=True)
+
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days + 1
+    transacoes['data'] = pd.Timestamp(inicio) + pd.to_timedelta(gerador.integers(0, dias, size=quantidade), unit='D')
+
+    return transacoes.sort_values('data', kind='stable', ignore_index=True)[
+        ['data', 'descricao', 'valor', 'categoria', 'tipo']]
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from armazenamento import Armazenamento
+from benchmarks.dados_sinteticos import gerar_transacoes
+from escritor import EscritorEmGrupo
+from memoria import TransacoesEmMemoria
+from painel import preparar_dashboard
+
+# Benchmarks dos caminhos críticos (carga, gravação, edição, exclusão,
+# exportação e dashboard) sobre livros-caixa sintéticos, sem o Streamlit.
+#
+# Uso, a partir da raiz do projeto:
+#   python -m benchmarks.executar --tamanhos 1000 100000 --saida resultados.json
+#   python -m benchmarks.executar --comparar resultados_anteriores.json
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]
+
+# Operações individuais de escrita medidas por tamanho (a média é reportada)
+OPERACOES_POR_ESCRITA = 100
+
+# Maior quantidade de linhas que cabe em uma planilha do Excel
+MAXIMO_LINHAS_EXCEL = 1_048_575
+
+# Razão de tempo acima da qual uma operação é marcada como regressão
+LIMITE_REGRESSAO = 1.2
+
+
+# Tempo médio de `repeticoes` chamadas e pico de memória alocada em uma
+# chamada extra (de `funcao_memoria`, se informada). O tracemalloc deixa o
+# código bem mais lento, por isso a memória é medida fora das chamadas
+# cronometradas; a função deve suportar repeticoes + 1 chamadas.
+def medir(funcao, repeticoes=1, funcao_memoria=None):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    segundos = (time.perf_counter() - inicio) / repeticoes
+
+    tracemalloc.start()
+    (funcao_memoria or funcao)()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'segundos': segundos, 'pico_memoria_mb': pico / 2**20}
+
+
+def executar_tamanho(linhas, diretorio):
+    gerador = np.random.default_rng(linhas)
+    transacoes = gerar_transacoes(linhas)
+    armazenamento = Armazenamento(os.path.join(diretorio, f'financas_{linhas}.db'))
+    escritor = EscritorEmGrupo(armazenamento)
+    resultados = {}
+
+    # A memória da gravação em lote é medida em um banco separado, para não duplicar os dados
+    ids = []
+    resultados['inserir_lote'] = medir(
+        lambda: ids.extend(armazenamento.inserir_transacoes(transacoes)),
+        funcao_memoria=lambda: Armazenamento(os.path.join(diretorio, f'memoria_{linhas}.db')).inserir_transacoes(transacoes))
+
+    resultados['carregar_dados'] = medir(
+        lambda: (armazenamento.carregar_transacoes(), armazenamento.carregar_categorias()))
+
+    memoria = TransacoesEmMemoria(armazenamento)
+    memoria.obter()
+
+    # Escritas pelo mesmo caminho do app (escritor em grupo), uma a uma
+    novas = gerar_transacoes(OPERACOES_POR_ESCRITA + 1, semente=linhas).to_dict('records')
+    pendentes = iter(novas)
+    resultados['adicionar_transacao'] = medir(
+        lambda: escritor.inserir_transacao(next(pendentes)), repeticoes=OPERACOES_POR_ESCRITA)
+
+    editar = iter(gerador.choice(ids, size=OPERACOES_POR_ESCRITA + 1, replace=False).tolist())
+    pendentes = iter(novas)
+    resultados['editar_transacao'] = medir(
+        lambda: escritor.atualizar_transacao(next(editar), next(pendentes)), repeticoes=OPERACOES_POR_ESCRITA)
+
+    excluir = iter(gerador.choice(ids, size=OPERACOES_POR_ESCRITA + 1, replace=False).tolist())
+    resultados['excluir_transacao'] = medir(
+        lambda: escritor.excluir_transacao(next(excluir)), repeticoes=OPERACOES_POR_ESCRITA)
+
+    # Atualização incremental da cópia em memória após as escritas acima. A
+    # chamada que mede a memória precisa de uma escrita nova para sincronizar:
+    # logo depois da primeira, a cópia já está em dia e não haveria o que medir.
+    resultados['sincronizar_memoria'] = medir(
+        memoria.obter, funcao_memoria=lambda: (escritor.inserir_transacao(novas[0]), memoria.obter()))
+
+    transacoes_atuais = memoria.obter()
+    resumo = armazenamento.carregar_resumo()
+    # A primeira chamada inclui a inicialização do Plotly e não é medida
+    preparar_dashboard(transacoes_atuais, resumo)
+    resultados['preparar_dashboard'] = medir(lambda: preparar_dashboard(transacoes_atuais, resumo))
+
+    if linhas <= MAXIMO_LINHAS_EXCEL:
+        resultados['exportar_excel'] = medir(armazenamento.exportar_excel)
+
+    return [{'linhas': linhas, 'operacao': operacao, **medida} for operacao, medida in resultados.items()]
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultados):
+    print(f"{'linhas':>10}  {'operação':<22} {'segundos':>12} {'pico (MB)':>10}")
+    for r in resultados:
+        print(f"{r['linhas']:>10}  {r['operacao']:<22} {r['segundos']:>12.6f} {r['pico_memoria_mb']:>10.1f}")
+
+
+# Compara com uma execução anterior e devolve as operações que ficaram mais lentas
+def comparar(resultados, arquivo_anterior):
+    with open(arquivo_anterior, encoding='utf-8') as f:
+        anteriores = {(r['linhas'], r['operacao']): r for r in json.load(f)['resultados']}
+
+    regressoes = []
+    print(f"\nComparação com {arquivo_anterior}:")
+    for r in resultados:
+        anterior = anteriores.get((r['linhas'], r['operacao']))
+        if anterior is None or anterior['segundos'] == 0:
+            continue
+        razao = r['segundos'] / anterior['segundos']
+        marca = '  REGRESSÃO' if razao > LIMITE_REGRESSAO else ''
+        print(f"{r['linhas']:>10}  {r['operacao']:<22} {razao:>8.2f}x{marca}")
+        if marca:
+            regressoes.append(r)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks do app de finanças com dados sintéticos.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO,
+                        help='quantidades de transações a testar (ex.: 1000 1000000 10000000)')
+    parser.add_argument('--saida', default=None, help='arquivo JSON onde salvar os resultados')
+    parser.add_argument('--comparar', default=None, help='JSON de uma execução anterior para comparação')
+    args = parser.parse_args()
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as diretorio:
+        for linhas in args.tamanhos:
+            resultados.extend(executar_tamanho(linhas, diretorio))
+
+    imprimir(resultados)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({
+                'gerado_em': datetime.now().isoformat(timespec='seconds'),
+                'commit': _commit_atual(),
+                'python': platform.python_version(),
+                'plataforma': platform.platform(),
+                'resultados': resultados,
+            }, f, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        regressoes = comparar(resultados, args.comparar)
+        if regressoes:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from armazenamento import Armazenamento
+from memoria import TransacoesEmMemoria
+
+
+@pytest.fixture
+def armazenamento(tmp_path):
+    return Armazenamento(str(tmp_path / 'financas.db'))
+
+
+@pytest.fixture
+def memoria(armazenamento):
+    return TransacoesEmMemoria(armazenamento)
+
+
+# Fábrica de transações no formato aceito pelo armazenamento (valor em reais)
+@pytest.fixture
+def transacao():
+    def criar(data='2024-01-10', valor=10.0, descricao='Teste', categoria='Outros', tipo='entrada'):
+        return {'data': pd.Timestamp(data), 'descricao': descricao, 'valor': valor, 'categoria': categoria,
+                'tipo': tipo}
+    return criar
@@ -0,0 +1,79 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+# Escritor único do banco, compartilhado por todas as sessões.
+# As escritas entram em uma fila e uma única thread as aplica: tudo o que se
+# acumulou na fila enquanto o commit anterior era gravado vai para o banco em
+# uma só transação (commit em grupo). Quem chamou espera pelo resultado da
+# própria operação.
+
+# Quantidade máxima de operações gravadas em um mesmo commit
+MAXIMO_LOTE = 500
+
+
+class EscritorEmGrupo:
+    def __init__(self, armazenamento):
+        self.armazenamento = armazenamento
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._executar, name='escritor-financas', daemon=True)
+        self._thread.start()
+
+    def inserir_transacao(self, transacao):
+        return self._enviar('inserir', transacao)
+
+    def atualizar_transacao(self, id_transacao, transacao):
+        return self._enviar('atualizar', id_transacao, transacao)
+
+    def excluir_transacao(self, id_transacao):
+        return self._enviar('excluir', id_transacao)
+
+    # Um bloco de linhas importadas é gravado como uma única operação
+    def importar_transacoes(self, transacoes):
+        return self._enviar('importar', transacoes)
+
+    # Várias transações (DataFrame) gravadas como uma única operação
+    def inserir_transacoes(self, transacoes):
+        return self._enviar('inserir_varias', transacoes)
+
+    def inserir_recorrente(self, regra):
+        return self._enviar('inserir_recorrente', regra)
+
+    def excluir_recorrente(self, id_regra):
+        return self._enviar('excluir_recorrente', id_regra)
+
+    # Lança as ocorrências recorrentes vencidas até a data informada
+    def lancar_recorrentes(self, ate):
+        return self._enviar('lancar_recorrentes', ate)
+
+    # Enfileira a operação sem esperar: devolve o Future com o resultado,
+    # para quem não pode bloquear (como os handlers assíncronos da API)
+    def agendar(self, operacao, *argumentos):
+        futuro = Future()
+        self._fila.put((operacao, argumentos, futuro))
+        return futuro
+
+    def _enviar(self, operacao, *argumentos):
+        return self.agendar(operacao, *argumentos).result()
+
+    def _executar(self):
+        while True:
+            # Espera a primeira operação e junta as que já estiverem na fila
+            lote = [self._fila.get()]
+            while len(lote) < MAXIMO_LOTE:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                resultados = self.armazenamento.aplicar_lote(
+                    [(operacao, argumentos) for operacao, argumentos, _ in lote])
+            except Exception as e:
+                resultados = [e] * len(lote)
+
+            for (_, _, futuro), resultado in zip(lote, resultados):
+                if isinstance(resultado, Exception):
+                    futuro.set_exception(resultado)
+                else:
+                    futuro.set_result(resultado)
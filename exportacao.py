@@ -0,0 +1,57 @@
+import pandas as pd
+
+# Exportação das transações para CSV ou Excel em blocos.
+# As transações chegam em blocos (Armazenamento.iterar_transacoes) e são
+# escritas à medida que são lidas, sem montar a tabela inteira na memória:
+# o CSV é produzido em partes que podem ser enviadas assim que ficam prontas
+# e a planilha usa o modo somente escrita do openpyxl, que grava as linhas
+# em disco em vez de manter cada célula em memória.
+
+# Mesmo formato aceito por Armazenamento.importar_excel, com o valor em reais
+COLUNAS_EXPORTACAO = ['id', 'data', 'descricao', 'valor', 'categoria', 'tipo']
+
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _formatar_bloco(bloco):
+    return bloco.assign(valor=bloco['valor_centavos'] / 100)[COLUNAS_EXPORTACAO]
+
+
+# Partes do CSV (em bytes), uma por bloco; o cabeçalho vai na primeira.
+# Por padrão usa o mesmo separador e decimal que a importação de extratos.
+def csv_em_partes(blocos, separador=';', decimal=','):
+    cabecalho = True
+    for bloco in blocos:
+        yield _formatar_bloco(bloco).to_csv(index=False, header=cabecalho, sep=separador,
+                                            decimal=decimal).encode('utf-8')
+        cabecalho = False
+    if cabecalho:
+        yield (separador.join(COLUNAS_EXPORTACAO) + '\n').encode('utf-8')
+
+
+# Grava a planilha (abas Transacoes e, se informada, Categorias) em `destino`,
+# um caminho ou arquivo binário aberto
+def escrever_xlsx(blocos, destino, categorias=None):
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet('Transacoes')
+    planilha.append(COLUNAS_EXPORTACAO)
+    for bloco in blocos:
+        bloco = _formatar_bloco(bloco)
+        linhas = zip(bloco['id'].tolist(), pd.to_datetime(bloco['data']).tolist(),
+                     bloco['descricao'].tolist(), bloco['valor'].tolist(), bloco['categoria'].tolist(),
+                     bloco['tipo'].tolist())
+        for linha in linhas:
+            planilha.append(linha)
+
+    if categorias is not None:
+        aba_categorias = livro.create_sheet('Categorias')
+        aba_categorias.append(list(categorias.columns))
+        for linha in categorias.itertuples(index=False, name=None):
+            aba_categorias.append(linha)
+
+    livro.save(destino)
@@ -0,0 +1,204 @@
+import hashlib
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# Importação em massa de extratos bancários (CSV ou OFX).
+# O arquivo é lido em blocos, sem carregá-lo inteiro na memória. Cada bloco é
+# normalizado para data, descricao, valor (em reais) e tipo, recebe um hash
+# do conteúdo de cada linha e é gravado de uma só vez; as linhas cujo hash já
+# foi importado antes são descartadas pelo armazenamento.
+
+# Linhas por bloco gravado
+TAMANHO_BLOCO = 5000
+
+# Caracteres lidos por vez dos arquivos OFX
+TAMANHO_LEITURA = 1 << 16
+
+CATEGORIA_PADRAO = 'Outros'
+
+# Valores aceitos na coluna de tipo do CSV (comparados em minúsculas)
+TIPOS_ENTRADA = {'entrada', 'crédito', 'credito', 'c', 'credit', 'cr'}
+TIPOS_SAIDA = {'saida', 'saída', 'débito', 'debito', 'd', 'debit', 'dr'}
+
+# Palavras usadas para sugerir qual coluna do CSV corresponde a cada campo
+PALAVRAS_COLUNAS = {
+    'data': ['data', 'date', 'dt'],
+    'descricao': ['descri', 'histórico', 'historico', 'memo', 'lançamento', 'lancamento'],
+    'valor': ['valor', 'amount', 'value', 'quantia'],
+    'tipo': ['tipo', 'type', 'natureza'],
+}
+
+_BLOCO_OFX = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+_CAMPO_OFX = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+# Mapeamento campo -> coluna sugerido a partir dos nomes das colunas do CSV
+def sugerir_mapeamento(colunas):
+    mapeamento = {}
+    for campo, palavras in PALAVRAS_COLUNAS.items():
+        mapeamento[campo] = next(
+            (c for c in colunas if any(p in str(c).lower() for p in palavras) and c not in mapeamento.values()),
+            None)
+    return mapeamento
+
+
+def ler_colunas_csv(arquivo, separador=';', codificacao='utf-8'):
+    colunas = pd.read_csv(arquivo, sep=separador, encoding=codificacao, encoding_errors='replace',
+                          nrows=0).columns.tolist()
+    arquivo.seek(0)
+    return colunas
+
+
+# Converte textos como "R$ 1.234,56" ou "-26.86" em números
+def _converter_valores(valores, decimal):
+    valores = valores.astype(str).str.replace(r'[R$\s]', '', regex=True)
+    if decimal == ',':
+        valores = valores.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        valores = valores.str.replace(',', '', regex=False)
+    return pd.to_numeric(valores, errors='coerce')
+
+
+# Blocos do CSV com as colunas data, descricao, valor (com sinal) e tipo
+# (None quando o sinal do valor define o tipo). `mapeamento` indica a coluna
+# do arquivo de cada campo; a de tipo é opcional.
+def blocos_csv(arquivo, mapeamento, separador=';', decimal=',', codificacao='utf-8',
+               tamanho_bloco=TAMANHO_BLOCO):
+    colunas = {mapeamento[campo]: campo for campo in ['data', 'descricao', 'valor', 'tipo']
+               if mapeamento.get(campo)}
+    if len(colunas) < len([campo for campo in ['data', 'descricao', 'valor', 'tipo'] if mapeamento.get(campo)]):
+        raise ValueError('Cada coluna do arquivo só pode ser usada em um campo.')
+    leitor = pd.read_csv(arquivo, sep=separador, encoding=codificacao, encoding_errors='replace',
+                         dtype=str, usecols=list(colunas), chunksize=tamanho_bloco)
+    for bruto in leitor:
+        bruto = bruto.rename(columns=colunas)
+        yield pd.DataFrame({
+            'data': _converter_datas(bruto['data']),
+            'descricao': bruto['descricao'],
+            'valor': _converter_valores(bruto['valor'], decimal),
+            'tipo': _converter_tipos(bruto['tipo']) if 'tipo' in bruto else None,
+        })
+
+
+# Datas no formato ISO (aaaa-mm-dd) ou com o dia primeiro (dd/mm/aaaa)
+def _converter_datas(datas):
+    datas = datas.astype(str).str.strip()
+    iso = datas.str.match(r'\d{4}-\d{2}-\d{2}')
+    return pd.to_datetime(datas.where(iso), format='ISO8601', errors='coerce').fillna(
+        pd.to_datetime(datas.where(~iso), dayfirst=True, format='mixed', errors='coerce'))
+
+
+def _converter_tipos(tipos):
+    tipos = tipos.astype(str).str.strip().str.lower()
+    return pd.Series(np.select([tipos.isin(TIPOS_ENTRADA), tipos.isin(TIPOS_SAIDA)],
+                               ['entrada', 'saida'], None), index=tipos.index)
+
+
+def _codificacao_ofx(cabecalho):
+    cabecalho = cabecalho.upper()
+    if b'CHARSET:1252' in cabecalho or b'ENCODING:USASCII' in cabecalho:
+        return 'cp1252'
+    return 'utf-8'
+
+
+# Campos de cada <STMTTRN> do arquivo, lido aos pedaços. Aceita tanto o OFX 1.x
+# (SGML, sem tags de fechamento) quanto o 2.x (XML).
+def _transacoes_ofx(arquivo):
+    codificacao = _codificacao_ofx(arquivo.read(1024))
+    arquivo.seek(0)
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, errors='replace')
+    try:
+        pendente = ''
+        for pedaco in iter(lambda: texto.read(TAMANHO_LEITURA), ''):
+            pendente += pedaco
+            fim = 0
+            for bloco in _BLOCO_OFX.finditer(pendente):
+                yield {nome.upper(): valor.strip() for nome, valor in _CAMPO_OFX.findall(bloco.group(1))}
+                fim = bloco.end()
+            # Guardar só o que pode ser o começo de uma transação ainda incompleta
+            inicio = pendente.upper().find('<STMTTRN>', fim)
+            pendente = pendente[inicio:] if inicio >= 0 else pendente[-len('<STMTTRN>'):]
+    finally:
+        # Não fechar o arquivo recebido junto com o leitor de texto
+        texto.detach()
+
+
+# Blocos do OFX com as mesmas colunas de blocos_csv, mais o identificador da
+# transação no banco (FITID)
+def blocos_ofx(arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    registros = []
+    for campos in _transacoes_ofx(arquivo):
+        registros.append(campos)
+        if len(registros) == tamanho_bloco:
+            yield _bloco_ofx(registros)
+            registros = []
+    if registros:
+        yield _bloco_ofx(registros)
+
+
+def _bloco_ofx(registros):
+    bruto = pd.DataFrame.from_records(registros, columns=['DTPOSTED', 'TRNAMT', 'MEMO', 'NAME', 'FITID'])
+    return pd.DataFrame({
+        'data': pd.to_datetime(bruto['DTPOSTED'].str[:8], format='%Y%m%d', errors='coerce'),
+        'descricao': bruto['MEMO'].where(bruto['MEMO'].fillna('') != '', bruto['NAME']),
+        'valor': pd.to_numeric(bruto['TRNAMT'].str.replace(',', '.', regex=False), errors='coerce'),
+        'tipo': None,
+        'identificador': bruto['FITID'],
+    })
+
+
+# Hash do conteúdo de cada linha. Linhas idênticas no mesmo arquivo (duas
+# compras iguais no mesmo dia) são diferenciadas pela ordem de ocorrência,
+# contada ao longo de todos os blocos em `ocorrencias`.
+def _calcular_hashes(transacoes, centavos, ocorrencias):
+    conteudo = (transacoes['data'].dt.strftime('%Y-%m-%d') + '|' + transacoes['descricao'] + '|' +
+                centavos.astype(str) + '|' + transacoes['tipo'] + '|' + transacoes['identificador'])
+    ordem = conteudo.groupby(conteudo, sort=False).cumcount() + conteudo.map(ocorrencias).fillna(0).astype('int64')
+    for chave, quantidade in conteudo.value_counts().items():
+        ocorrencias[chave] = ocorrencias.get(chave, 0) + quantidade
+    return [hashlib.blake2b(f'{c}|{o}'.encode(), digest_size=16).hexdigest()
+            for c, o in zip(conteudo, ordem)]
+
+
+# Normaliza os blocos lidos e grava cada um com `gravar` (que recebe o
+# DataFrame do bloco e devolve os IDs inseridos). `categorizar`, se
+# informado, recebe o bloco e devolve a categoria de cada linha (None para
+# usar a padrão); `ao_progredir` recebe o resultado parcial após cada bloco.
+# Devolve a quantidade de linhas importadas, duplicadas e inválidas.
+def importar_blocos(blocos, gravar, ao_progredir=None, categorizar=None):
+    resultado = {'importadas': 0, 'duplicadas': 0, 'invalidas': 0}
+    ocorrencias = {}
+
+    for bloco in blocos:
+        validas = bloco['data'].notna() & bloco['valor'].notna() & (bloco['valor'] != 0)
+        resultado['invalidas'] += int((~validas).sum())
+        bloco = bloco[validas]
+
+        if not bloco.empty:
+            # Sem coluna de tipo, o sinal do valor decide: negativo é saída
+            tipo_pelo_sinal = pd.Series(np.where(bloco['valor'] < 0, 'saida', 'entrada'), index=bloco.index)
+            tipo = bloco['tipo'].fillna(tipo_pelo_sinal) if bloco['tipo'].notna().any() else tipo_pelo_sinal
+            transacoes = pd.DataFrame({
+                'data': bloco['data'],
+                'descricao': bloco['descricao'].fillna('').astype(str).str.strip(),
+                'valor': bloco['valor'].abs(),
+                'categoria': CATEGORIA_PADRAO,
+                'tipo': tipo,
+                'identificador': bloco['identificador'].fillna('') if 'identificador' in bloco else '',
+            })
+            if categorizar is not None:
+                transacoes['categoria'] = categorizar(transacoes).fillna(CATEGORIA_PADRAO)
+            centavos = (transacoes['valor'] * 100).round().astype('int64')
+            transacoes['hash'] = _calcular_hashes(transacoes, centavos, ocorrencias)
+
+            ids = gravar(transacoes.drop(columns='identificador'))
+            resultado['importadas'] += len(ids)
+            resultado['duplicadas'] += len(transacoes) - len(ids)
+
+        if ao_progredir is not None:
+            ao_progredir(dict(resultado))
+
+    return resultado
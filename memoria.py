@@ -0,0 +1,81 @@
+import threading
+
+from modelo import substituir_transacoes
+from saldo import SaldoCorrente
+from sugestoes import SugestorCategorias
+
+# Cópia em memória das transações, compartilhada entre as sessões e
+# identificada pela versão dos dados (sequência do diário do banco).
+# A cada leitura compara a versão em memória com a do banco e aplica apenas
+# as transações alteradas desde então, em vez de descartar tudo e reler o
+# banco inteiro.
+
+# Acima desta quantidade de alterações pendentes é mais barato reler tudo
+LIMITE_ALTERACOES = 5000
+
+
+class TransacoesEmMemoria:
+    def __init__(self, armazenamento):
+        self.armazenamento = armazenamento
+        self.transacoes = None
+        self.versao = None
+        self.saldo_corrente = SaldoCorrente()
+        # Índice de sugestão de categorias, montado no primeiro uso a partir das
+        # contagens por descrição (sem carregar as transações) e com versão própria
+        self.sugestor = None
+        self.versao_sugestor = None
+        self._trava = threading.Lock()
+
+    # Devolve as transações na versão mais recente do banco
+    def obter(self):
+        return self.obter_versionado()[1]
+
+    # Devolve (versao, transacoes), lidos juntos, para chavear caches pela versão
+    def obter_versionado(self):
+        with self._trava:
+            self._atualizar()
+            return self.versao, self.transacoes
+
+    # Sugestor de categorias treinado com as transações na versão mais recente
+    def obter_sugestor(self):
+        with self._trava:
+            if self.sugestor is None:
+                self.versao_sugestor, contagens = self.armazenamento.carregar_contagens_descricoes()
+                self.sugestor = SugestorCategorias()
+                self.sugestor.adicionar_contagens(contagens)
+            elif self.armazenamento.versao() != self.versao_sugestor:
+                self.versao_sugestor, removidas, adicionadas = \
+                    self.armazenamento.alteracoes_descricoes_desde(self.versao_sugestor)
+                self.sugestor.remover_contagens(removidas)
+                self.sugestor.adicionar_contagens(adicionadas)
+            return self.sugestor
+
+    def _atualizar(self):
+        if self.transacoes is None:
+            self._recarregar()
+        elif self.armazenamento.versao() != self.versao:
+            self._sincronizar()
+
+    def _recarregar(self):
+        self.versao, self.transacoes = self.armazenamento.carregar_transacoes_versionadas()
+        self.saldo_corrente = SaldoCorrente()
+
+    def _sincronizar(self):
+        versao, ids, atuais = self.armazenamento.alteracoes_desde(self.versao)
+        if len(ids) > LIMITE_ALTERACOES:
+            self._recarregar()
+            return
+
+        alteradas = self.transacoes.index.isin(ids)
+        anteriores = self.transacoes[alteradas]
+
+        # O saldo só precisa ser recalculado a partir da data mais antiga afetada
+        datas_afetadas = [datas.min() for datas in [anteriores['data'], atuais['data']] if not datas.empty]
+        if datas_afetadas:
+            self.saldo_corrente.invalidar(min(datas_afetadas), versao)
+
+        # As linhas alteradas saem e as atuais entram já na posição da sua data,
+        # sem reordenar nem converter de novo a tabela inteira. A tabela
+        # anterior não é modificada: outras sessões podem estar usando-a.
+        self.transacoes = substituir_transacoes(self.transacoes, ids, atuais)
+        self.versao = versao
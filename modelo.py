@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Representação em memória das transações.
+# Valores ficam em centavos (int64), tipo e categoria como categóricos e a
+# descrição como string do Arrow. As linhas são mantidas em ordem de data, o
+# que permite recortar um período por busca binária e devolver uma fatia da
+# tabela em vez de uma cópia filtrada por máscara.
+
+COLUNAS_TRANSACOES = ['id', 'data', 'descricao', 'valor_centavos', 'categoria', 'tipo']
+
+TIPO_TRANSACAO = pd.CategoricalDtype(['entrada', 'saida'])
+
+
+def para_centavos(valor):
+    return int(round(float(valor) * 100))
+
+
+def para_reais(centavos):
+    return centavos / 100
+
+
+# Converte as colunas para os tipos do modelo, ordena por data e indexa pelo ID
+def tipar_transacoes(transacoes, ordenar_por_data=True):
+    transacoes = transacoes.astype({
+        'id': 'int64',
+        'data': 'datetime64[ns]',
+        'descricao': 'string[pyarrow]',
+        'valor_centavos': 'int64',
+        'categoria': 'category',
+        'tipo': TIPO_TRANSACAO,
+    })
+    if ordenar_por_data:
+        ordem = np.lexsort((transacoes['id'].to_numpy(), transacoes['data'].to_numpy()))
+        transacoes = transacoes.iloc[ordem]
+    transacoes.index = pd.Index(transacoes['id'].to_numpy())
+    return transacoes
+
+
+# Acima desta quantidade de trechos é mais barato montar a tabela por índice
+MAXIMO_TRECHOS = 64
+
+
+# Tabela sem as linhas dos IDs em `removidos` e com as transações `novas`
+# (tipadas e em ordem de data) nas posições que mantêm a ordem por data e ID.
+# Nada é reordenado nem convertido de novo: a posição de cada linha nova é
+# achada por busca binária e a tabela é montada com fatias da original.
+def substituir_transacoes(transacoes, removidos, novas):
+    if len(removidos):
+        mantidas = np.flatnonzero(~transacoes.index.isin(removidos))
+    else:
+        mantidas = np.arange(len(transacoes))
+    if novas.empty and len(mantidas) == len(transacoes):
+        return transacoes
+
+    ordem = mantidas
+    if not novas.empty:
+        # Posição entre as mantidas: pela data e, entre as de mesma data, pelo ID
+        datas = transacoes['data'].to_numpy()
+        ids = transacoes['id'].to_numpy()
+        if len(mantidas) < len(transacoes):
+            datas, ids = datas[mantidas], ids[mantidas]
+        novas_datas = novas['data'].to_numpy()
+        inicio = np.searchsorted(datas, novas_datas, side='left')
+        fim = np.searchsorted(datas, novas_datas, side='right')
+        posicoes = inicio.copy()
+        for i in np.flatnonzero(fim > inicio):
+            posicoes[i] += np.searchsorted(ids[inicio[i]:fim[i]], novas['id'].iat[i])
+
+        # As categorias novas entram no fim, sem recodificar as existentes
+        existentes = transacoes['categoria'].cat.categories
+        categorias = existentes.append(novas['categoria'].cat.categories.difference(existentes))
+        if len(categorias) > len(existentes):
+            transacoes = transacoes.assign(categoria=transacoes['categoria'].cat.add_categories(
+                categorias[len(existentes):]))
+        novas = novas.assign(categoria=novas['categoria'].cat.set_categories(categorias))
+
+        ordem = np.insert(mantidas, posicoes, len(transacoes) + np.arange(len(novas)))
+
+    # Um trecho termina onde a sequência pula ou passa da tabela para as novas
+    quebras = np.flatnonzero((np.diff(ordem) != 1) | (ordem[1:] == len(transacoes))) + 1
+    if len(quebras) >= MAXIMO_TRECHOS:
+        return pd.concat([transacoes, novas]).iloc[ordem]
+
+    # Trechos contínuos de cada tabela, concatenados em uma só cópia
+    trechos = []
+    for primeira, ultima in zip(ordem[np.append(0, quebras)], ordem[np.append(quebras, len(ordem)) - 1]):
+        if primeira < len(transacoes):
+            trechos.append(transacoes.iloc[primeira:ultima + 1])
+        else:
+            trechos.append(novas.iloc[primeira - len(transacoes):ultima - len(transacoes) + 1])
+    return pd.concat(trechos)
+
+
+# Fatia das transações com data em [inicio, fim), sem copiar as linhas
+def fatia_periodo(transacoes, inicio, fim):
+    datas = transacoes['data']
+    inicio = datas.searchsorted(pd.Timestamp(inicio), side='left')
+    fim = datas.searchsorted(pd.Timestamp(fim), side='left')
+    return transacoes.iloc[inicio:fim]
+
+
+def fatia_mes(transacoes, ano, mes):
+    inicio = pd.Timestamp(year=ano, month=mes, day=1)
+    return fatia_periodo(transacoes, inicio, inicio + pd.offsets.MonthBegin(1))
+
+
+# Valores em centavos formatados como "R$ 1234.56", sem laço em Python
+def formatar_reais(centavos):
+    centavos = pd.Series(centavos).astype('int64')
+    reais, resto = np.divmod(centavos.abs(), 100)
+    sinal = np.where(centavos < 0, '-', '')
+    return 'R$ ' + sinal + reais.astype(str) + '.' + resto.astype(str).str.zfill(2)
+
+
+# Colunas de exibição (data dd/mm/aaaa e valor em reais) de uma página de transações
+def formatar_para_exibicao(transacoes):
+    return transacoes.assign(
+        data=transacoes['data'].dt.strftime('%d/%m/%Y'),
+        valor=formatar_reais(transacoes['valor_centavos']),
+    )
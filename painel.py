@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import pandas as pd
+
+from amostragem import reduzir_serie
+from armazenamento import transacoes_vazias
+from modelo import fatia_mes, para_reais
+from perfil import etapa
+from recorrencias import expandir_recorrencias, projetar_saldo
+from saldo import calcular_saldo_acumulado
+
+# Métricas e gráficos do dashboard. Não depende do Streamlit, para poder ser
+# usado também fora da interface (benchmarks, scripts).
+
+# Quantidade máxima de pontos enviados ao navegador no gráfico de saldo
+PONTOS_GRAFICO_SALDO = 2000
+
+# A partir desta quantidade de pontos na série original o gráfico usa WebGL
+LIMITE_WEBGL = 5000
+
+# Horizonte da previsão de saldo com as transações recorrentes
+MESES_PREVISAO = 12
+
+
+# Linhas do cubo de resumo do mês e totais do mês em reais (entradas, saídas e saldo)
+def metricas_mes(resumo, ano, mes):
+    resumo_mes = resumo[(resumo['mes'] == mes) & (resumo['ano'] == ano)]
+    totais_mes = resumo_mes.groupby('tipo')['total_centavos'].sum()
+    entradas_mes = para_reais(totais_mes.get('entrada', 0))
+    saidas_mes = para_reais(totais_mes.get('saida', 0))
+    saldo_mes = para_reais(totais_mes.get('entrada', 0) - totais_mes.get('saida', 0))
+    return resumo_mes, entradas_mes, saidas_mes, saldo_mes
+
+
+# Totais de despesas do mês por categoria, em reais
+def despesas_por_categoria(resumo_mes):
+    despesas_no_mes = resumo_mes[resumo_mes['tipo'] == 'saida']
+    return para_reais(despesas_no_mes.groupby('categoria')['total_centavos'].sum()).reset_index(name='valor')
+
+
+# Entradas e saídas de cada mês ("aaaa-mm"), em reais
+def resumo_mensal(resumo):
+    resumo = resumo.assign(ano_mes=resumo['ano'].astype(str) + '-' + resumo['mes'].astype(str).str.zfill(2))
+    return para_reais(resumo.groupby(['ano_mes', 'tipo'])['total_centavos'].sum().unstack()).reset_index()
+
+
+# Preparar gráficos e métricas. `versao` é a versão dos dados de `transacoes`,
+# usada pelo saldo corrente (compartilhado entre as sessões).
+def preparar_dashboard(transacoes, resumo, saldo_corrente=None, periodo_saldo=None, recorrentes=None, versao=None):
+    # Garantir que transacoes seja um DataFrame
+    if not isinstance(transacoes, pd.DataFrame):
+        transacoes = transacoes_vazias()
+        
+    # Inicializar variáveis com valores padrão
+    fig_pizza = None
+    fig_barras = None
+    fig_linha = None
+    ultimas_transacoes = pd.DataFrame()
+    df_mes = pd.DataFrame()
+    entradas_mes = 0.0
+    saidas_mes = 0.0
+    saldo_mes = 0.0
+        
+    if transacoes.empty:
+        return fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes
+    
+    # O Plotly só é importado por quem monta os gráficos (a API usa apenas as métricas)
+    import plotly.express as px
+    
+    with etapa('agregar'):
+        # Filtrar para o mês atual (fatia do período, sem cópia)
+        mes_atual = datetime.now().month
+        ano_atual = datetime.now().year
+        df_mes = fatia_mes(transacoes, ano_atual, mes_atual)
+        
+        # Métricas e gráficos agregados são lidos do cubo de resumo, sem varrer as
+        # transações (somas exatas em centavos)
+        resumo_mes, entradas_mes, saidas_mes, saldo_mes = metricas_mes(resumo, ano_atual, mes_atual)
+    
+    # Gráfico de Pizza para categorias de despesas no mês atual
+    despesas = despesas_por_categoria(resumo_mes)
+    if not despesas.empty:
+        with etapa('graficos'):
+            fig_pizza = px.pie(despesas, values='valor', names='categoria', 
+                              title='Despesas por Categoria (Mês Atual)')
+    
+    # Gráfico de Barras para entradas/saídas por mês
+    mensal = resumo_mensal(resumo)
+    
+    if not mensal.empty and all(col in mensal.columns for col in ['entrada', 'saida']):
+        mensal.fillna(0, inplace=True)
+        with etapa('graficos'):
+            fig_barras = px.bar(mensal, x='ano_mes', y=['entrada', 'saida'], 
+                               title='Entradas e Saídas por Mês',
+                               labels={'value': 'Valor', 'ano_mes': 'Mês', 'variable': 'Tipo'},
+                               barmode='group')
+    
+    # Evolução do saldo
+    if not transacoes.empty:
+        with etapa('agregar'):
+            if saldo_corrente is not None:
+                evolucao_saldo = saldo_corrente.serie(transacoes, versao)
+            else:
+                evolucao_saldo = calcular_saldo_acumulado(transacoes)
+            
+            # Previsão do saldo com as ocorrências recorrentes ainda não vencidas,
+            # a partir do último saldo; só aparece quando o fim do histórico está visível
+            previsao = None
+            ultima_data = evolucao_saldo['data'].iloc[-1]
+            if (recorrentes is not None and not recorrentes.empty and
+                    (periodo_saldo is None or pd.Timestamp(periodo_saldo[1]) > ultima_data)):
+                hoje = pd.Timestamp(datetime.now().date())
+                ocorrencias = expandir_recorrencias(
+                    recorrentes, hoje + pd.DateOffset(months=MESES_PREVISAO), max(hoje, ultima_data) + pd.Timedelta(days=1))
+                if not ocorrencias.empty:
+                    previsao = projetar_saldo(ocorrencias, max(hoje, ultima_data),
+                                              evolucao_saldo['saldo_acumulado'].iloc[-1])
+            
+            # Recorte do período escolhido, [inicio, fim); períodos curtos aparecem em resolução total
+            if periodo_saldo is not None:
+                inicio, fim = evolucao_saldo['data'].searchsorted([pd.Timestamp(p) for p in periodo_saldo])
+                evolucao_saldo = evolucao_saldo.iloc[inicio:fim]
+            
+            pontos_originais = len(evolucao_saldo)
+            evolucao_saldo = reduzir_serie(evolucao_saldo, 'data', 'saldo_acumulado', PONTOS_GRAFICO_SALDO)
+        
+        with etapa('graficos'):
+            fig_linha = px.line(evolucao_saldo, x='data', y='saldo_acumulado', 
+                              title='Evolução do Saldo ao Longo do Tempo',
+                              render_mode='webgl' if pontos_originais > LIMITE_WEBGL else 'svg')
+            if previsao is not None:
+                fig_linha.add_scatter(x=previsao['data'], y=previsao['saldo_previsto'], mode='lines',
+                                      name='Previsão', line={'dash': 'dash'})
+    
+    # Últimas transações
+    if not transacoes.empty:
+        # As transações já estão ordenadas por data
+        ultimas_transacoes = transacoes.iloc[::-1].head(5)
+    
+    return fig_pizza, fig_barras, fig_linha, ultimas_transacoes, df_mes, entradas_mes, saidas_mes, saldo_mes
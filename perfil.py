@@ -0,0 +1,81 @@
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Instrumentação dos caminhos críticos.
+# Cada execução do script (rerun) acumula a duração das etapas marcadas com
+# `etapa(...)` (carga, gravação, agregação, montagem de gráficos, renderização).
+# Ao final da execução as durações são registradas como uma linha JSON no log
+# e somadas às métricas acumuladas do processo.
+
+logger = logging.getLogger('financas.perfil')
+
+_etapas = contextvars.ContextVar('etapas_perfil', default=None)
+
+_trava = threading.Lock()
+_metricas = {}
+
+
+# Envia o log de desempenho para um arquivo (ou para a saída de erro, com '-')
+def configurar_log(destino):
+    if not destino or logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if destino == '-' else logging.FileHandler(destino, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def iniciar_execucao():
+    _etapas.set([])
+
+
+@contextmanager
+def etapa(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registros = _etapas.get()
+        if registros is not None:
+            registros.append((nome, time.perf_counter() - inicio))
+
+
+# Encerra a execução atual: registra no log, acumula nas métricas e devolve
+# a lista de (etapa, segundos) na ordem em que terminaram
+def finalizar_execucao(pagina=None):
+    registros = _etapas.get() or []
+    _etapas.set(None)
+
+    totais = {}
+    for nome, segundos in registros:
+        totais[nome] = totais.get(nome, 0.0) + segundos
+
+    with _trava:
+        for nome, segundos in totais.items():
+            metrica = _metricas.setdefault(nome, {'execucoes': 0, 'total_segundos': 0.0, 'maximo_segundos': 0.0})
+            metrica['execucoes'] += 1
+            metrica['total_segundos'] += segundos
+            metrica['maximo_segundos'] = max(metrica['maximo_segundos'], segundos)
+
+    if registros:
+        logger.info(json.dumps({
+            'evento': 'execucao',
+            'momento': datetime.now().isoformat(timespec='milliseconds'),
+            'pagina': pagina,
+            'etapas_ms': {nome: round(segundos * 1000, 3) for nome, segundos in totais.items()},
+        }, ensure_ascii=False))
+
+    return registros
+
+
+# Métricas acumuladas desde o início do processo, por etapa
+def metricas_acumuladas():
+    with _trava:
+        return {nome: dict(metrica) for nome, metrica in _metricas.items()}
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from modelo import para_reais
+from saldo import valores_com_sinal
+
+# Transações recorrentes (aluguel, salário, assinaturas).
+# Cada regra gera ocorrências semanais, mensais ou anuais (a cada `intervalo`
+# períodos) desde a data de início até a data final, se houver. A expansão é
+# toda vetorizada: as ocorrências de todas as regras são calculadas de uma vez
+# com aritmética de datas do NumPy, sem laço por regra ou por data.
+# As ocorrências só entram no livro-caixa quando vencem; as futuras servem
+# apenas para a previsão do saldo.
+
+FREQUENCIAS = ['semanal', 'mensal', 'anual']
+
+COLUNAS_RECORRENTES = ['id', 'descricao', 'valor_centavos', 'categoria', 'tipo', 'frequencia', 'intervalo',
+                       'inicio', 'fim', 'ultima_lancada']
+COLUNAS_OCORRENCIAS = ['data', 'descricao', 'valor_centavos', 'categoria', 'tipo', 'id_regra']
+
+
+def recorrentes_vazias():
+    return pd.DataFrame({coluna: [] for coluna in COLUNAS_RECORRENTES})
+
+
+def _datas(valores):
+    return pd.to_datetime(pd.Series(valores)).to_numpy(dtype='datetime64[D]')
+
+
+# Para cada i, os inteiros primeiros[i], primeiros[i] + 1, ... (quantidades[i]
+# valores); devolve a posição de origem de cada valor e os valores
+def _sequencias(primeiros, quantidades):
+    origem = np.repeat(np.arange(len(primeiros)), quantidades)
+    deslocamentos = np.arange(quantidades.sum()) - np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+    return origem, primeiros[origem] + deslocamentos
+
+
+# Ocorrências das regras com data em [desde, ate]. `desde` pode ser uma data
+# ou uma sequência com uma data por regra (NaT para não limitar).
+def expandir_recorrencias(regras, ate, desde=None):
+    if regras.empty:
+        return pd.DataFrame({coluna: [] for coluna in COLUNAS_OCORRENCIAS})
+
+    inicio = _datas(regras['inicio'])
+    fim = _datas(regras['fim'])
+    intervalo = regras['intervalo'].to_numpy(dtype='int64')
+    frequencia = regras['frequencia'].to_numpy()
+
+    # Janela de cada regra: do maior entre o início e `desde` ao menor entre o fim e `ate`
+    limite_inferior = inicio
+    if desde is not None:
+        desde = np.broadcast_to(_datas(np.atleast_1d(desde)), inicio.shape)
+        limite_inferior = np.where(np.isnat(desde) | (desde < inicio), inicio, desde)
+    limite_superior = np.datetime64(pd.Timestamp(ate), 'D')
+    limite_superior = np.where(np.isnat(fim) | (fim > limite_superior), limite_superior, fim)
+
+    # Semanais: passo fixo de 7 * intervalo dias a partir do início
+    semanal = frequencia == 'semanal'
+    passo = 7 * intervalo[semanal]
+    dias_inferior = (limite_inferior[semanal] - inicio[semanal]).astype('int64')
+    dias_superior = (limite_superior[semanal] - inicio[semanal]).astype('int64')
+    primeiros = -(-dias_inferior // passo)
+    quantidades = np.maximum(dias_superior // passo - primeiros + 1, 0)
+    origem, k = _sequencias(primeiros, quantidades)
+    indices_semanais = np.flatnonzero(semanal)[origem]
+    datas_semanais = inicio[indices_semanais] + k * passo[origem]
+
+    # Mensais e anuais: passo em meses, no mesmo dia do início (ou no último
+    # dia do mês, nos meses mais curtos)
+    mensal = ~semanal
+    passo = np.where(frequencia[mensal] == 'anual', 12, 1) * intervalo[mensal]
+    mes_inicio = inicio[mensal].astype('datetime64[M]')
+    meses_inferior = (limite_inferior[mensal].astype('datetime64[M]') - mes_inicio).astype('int64')
+    meses_superior = (limite_superior[mensal].astype('datetime64[M]') - mes_inicio).astype('int64')
+    primeiros = -(-meses_inferior // passo)
+    quantidades = np.maximum(meses_superior // passo - primeiros + 1, 0)
+    origem, k = _sequencias(primeiros, quantidades)
+    indices_mensais = np.flatnonzero(mensal)[origem]
+
+    meses = mes_inicio[origem] + k * passo[origem]
+    dias_no_mes = ((meses + 1).astype('datetime64[D]') - meses.astype('datetime64[D]')).astype('int64')
+    dia = (inicio[indices_mensais] - inicio[indices_mensais].astype('datetime64[M]')).astype('int64') + 1
+    datas_mensais = meses.astype('datetime64[D]') + (np.minimum(dia, dias_no_mes) - 1)
+
+    # O dia ajustado pode cair fora da janela no primeiro e no último mês
+    indices = np.concatenate([indices_semanais, indices_mensais])
+    datas = np.concatenate([datas_semanais, datas_mensais])
+    dentro = (datas >= limite_inferior[indices]) & (datas <= limite_superior[indices])
+    indices, datas = indices[dentro], datas[dentro]
+
+    ordem = np.lexsort((indices, datas))
+    indices, datas = indices[ordem], datas[ordem]
+    return pd.DataFrame({
+        'data': datas.astype('datetime64[ns]'),
+        'descricao': regras['descricao'].to_numpy()[indices],
+        'valor_centavos': regras['valor_centavos'].to_numpy(dtype='int64')[indices],
+        'categoria': regras['categoria'].to_numpy()[indices],
+        'tipo': regras['tipo'].to_numpy()[indices],
+        'id_regra': regras['id'].to_numpy(dtype='int64')[indices],
+    })
+
+
+# Saldo previsto a partir de (data_inicial, saldo_inicial em reais), somando as
+# ocorrências posteriores em ordem de data
+def projetar_saldo(ocorrencias, data_inicial, saldo_inicial):
+    saldos = saldo_inicial + para_reais(np.cumsum(valores_com_sinal(ocorrencias)))
+    return pd.DataFrame({
+        'data': np.concatenate([[np.datetime64(pd.Timestamp(data_inicial), 'ns')],
+                                ocorrencias['data'].to_numpy(dtype='datetime64[ns]')]),
+        'saldo_previsto': np.concatenate([[saldo_inicial], saldos]),
+    })
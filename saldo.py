@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from modelo import para_reais
+
+# Cálculo do saldo acumulado (evolução do saldo ao longo do tempo).
+# Todo o cálculo é vetorizado com NumPy; a classe SaldoCorrente guarda o
+# saldo de fim de cada mês como ponto de controle para que uma alteração em
+# uma transação antiga recalcule apenas os saldos a partir daquele mês.
+# Os saldos guardados pertencem a uma versão dos dados: como a instância é
+# compartilhada entre sessões, uma sessão pode pedir a série de uma versão
+# anterior ou posterior àquela em que os pontos de controle foram calculados.
+
+
+# Valores com sinal, em centavos: entradas somam e saídas subtraem do saldo
+def valores_com_sinal(transacoes):
+    valores = transacoes['valor_centavos'].to_numpy(dtype='int64')
+    return np.where((transacoes['tipo'] == 'entrada').to_numpy(), valores, -valores)
+
+
+# Ordem cronológica das transações, desempatando pelo ID
+def _ordem_cronologica(datas, ids):
+    return np.lexsort((ids, datas))
+
+
+def calcular_saldo_acumulado(transacoes):
+    datas = transacoes['data'].to_numpy(dtype='datetime64[ns]')
+    ordem = _ordem_cronologica(datas, transacoes['id'].to_numpy())
+    saldos = np.cumsum(valores_com_sinal(transacoes)[ordem])
+    return pd.DataFrame({'data': datas[ordem], 'saldo_acumulado': para_reais(saldos)})
+
+
+class SaldoCorrente:
+    def __init__(self):
+        self.datas = np.array([], dtype='datetime64[ns]')
+        self.saldos = np.array([], dtype='int64')
+        # Pontos de controle: saldo no fim de cada mês com transações
+        self.meses = np.array([], dtype='datetime64[M]')
+        self.saldos_fim_mes = np.array([], dtype='int64')
+        # Versão dos dados dos saldos guardados e versão a que a invalidação pendente leva
+        self.versao = None
+        self.calculado = False
+        self.invalido_desde = None
+        self.versao_invalidada = None
+        self._trava = threading.Lock()
+
+    # Marca os saldos como desatualizados a partir do mês da data informada,
+    # na passagem para a versão `versao` dos dados
+    def invalidar(self, data, versao):
+        mes = np.datetime64(pd.Timestamp(data), 'M')
+        with self._trava:
+            if self.invalido_desde is None or mes < self.invalido_desde:
+                self.invalido_desde = mes
+            self.versao_invalidada = versao
+
+    # Série do saldo das transações, que devem estar na versão `versao`. Só a
+    # versão a que a invalidação pendente leva é recalculada em parte; qualquer
+    # outra diferente da guardada é recalculada do início.
+    def serie(self, transacoes, versao):
+        with self._trava:
+            if not self.calculado or versao != self.versao:
+                if self.calculado and self.invalido_desde is not None and versao == self.versao_invalidada:
+                    self._recalcular(transacoes, self.invalido_desde)
+                else:
+                    self._recalcular(transacoes, None)
+                self.versao = versao
+                self.calculado = True
+                self.invalido_desde = None
+                self.versao_invalidada = None
+            return pd.DataFrame({'data': self.datas, 'saldo_acumulado': para_reais(self.saldos)})
+
+    def _recalcular(self, transacoes, inicio):
+        datas = transacoes['data'].to_numpy(dtype='datetime64[ns]')
+        ids = transacoes['id'].to_numpy()
+        valores = valores_com_sinal(transacoes)
+
+        if inicio is None:
+            corte = 0
+            meses_mantidos = 0
+            base = 0
+        else:
+            # Mantém os saldos anteriores ao mês alterado e parte do ponto de controle do mês anterior
+            corte = np.searchsorted(self.datas, inicio.astype('datetime64[ns]'))
+            meses_mantidos = np.searchsorted(self.meses, inicio)
+            base = self.saldos_fim_mes[meses_mantidos - 1] if meses_mantidos else 0
+
+            selecionadas = datas >= inicio.astype('datetime64[ns]')
+            datas, ids, valores = datas[selecionadas], ids[selecionadas], valores[selecionadas]
+
+        ordem = _ordem_cronologica(datas, ids)
+        datas = datas[ordem]
+        saldos = base + np.cumsum(valores[ordem])
+
+        # Pontos de controle dos meses recalculados: última posição de cada mês
+        meses = datas.astype('datetime64[M]')
+        fim_mes = np.flatnonzero(np.append(meses[1:] != meses[:-1], True)) if len(meses) else np.array([], dtype=int)
+
+        self.datas = np.concatenate([self.datas[:corte], datas])
+        self.saldos = np.concatenate([self.saldos[:corte], saldos])
+        self.meses = np.concatenate([self.meses[:meses_mantidos], meses[fim_mes]])
+        self.saldos_fim_mes = np.concatenate([self.saldos_fim_mes[:meses_mantidos], saldos[fim_mes]])
@@ -0,0 +1,122 @@
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+# Sugestão de categoria a partir do histórico de transações.
+# Cada palavra das descrições já registradas guarda quantas vezes apareceu em
+# cada (tipo, categoria); um índice de prefixos leva da palavra ainda sendo
+# digitada às palavras conhecidas que começam com ela. A sugestão soma, para
+# cada palavra da descrição, a proporção de uso de cada categoria, de modo que
+# palavras específicas ("ifood") pesam mais que as genéricas ("pagamento").
+# O índice é atualizado aos poucos, conforme as transações mudam.
+
+# Tamanho mínimo e máximo dos prefixos indexados
+MINIMO_PREFIXO = 2
+MAXIMO_PREFIXO = 10
+
+_PALAVRA = re.compile(r'[a-z0-9]+')
+
+
+# Palavras da descrição, em minúsculas e sem acentos; números e letras soltas são ignorados
+def palavras(descricao):
+    texto = unicodedata.normalize('NFKD', str(descricao).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [p for p in _PALAVRA.findall(texto) if len(p) >= MINIMO_PREFIXO and not p.isdigit()]
+
+
+class SugestorCategorias:
+    def __init__(self):
+        # palavra -> Counter de (tipo, categoria)
+        self.contagens = defaultdict(Counter)
+        # prefixo -> palavras conhecidas com esse prefixo
+        self.prefixos = defaultdict(set)
+        self._trava = threading.Lock()
+
+    # Acrescenta (ou, com sinal=-1, retira) as transações do índice
+    def adicionar(self, transacoes, sinal=1):
+        if transacoes.empty:
+            return
+        grupos = transacoes.groupby(['descricao', 'tipo', 'categoria'], observed=True).size()
+        self._adicionar_grupos(grupos.items(), sinal)
+
+    def remover(self, transacoes):
+        self.adicionar(transacoes, sinal=-1)
+
+    # Como adicionar, a partir das contagens já agregadas (colunas descricao,
+    # tipo, categoria e quantidade)
+    def adicionar_contagens(self, contagens, sinal=1):
+        chaves = zip(contagens['descricao'], contagens['tipo'], contagens['categoria'])
+        self._adicionar_grupos(zip(chaves, contagens['quantidade'].tolist()), sinal)
+
+    def remover_contagens(self, contagens):
+        self.adicionar_contagens(contagens, sinal=-1)
+
+    def _adicionar_grupos(self, grupos, sinal):
+        with self._trava:
+            for (descricao, tipo, categoria), quantidade in grupos:
+                for palavra in set(palavras(descricao)):
+                    self._contar(palavra, (tipo, categoria), sinal * quantidade)
+
+    def _contar(self, palavra, chave, quantidade):
+        contagem = self.contagens[palavra]
+        contagem[chave] += quantidade
+        if contagem[chave] <= 0:
+            del contagem[chave]
+        if contagem:
+            if quantidade > 0:
+                for tamanho in range(MINIMO_PREFIXO, min(len(palavra), MAXIMO_PREFIXO) + 1):
+                    self.prefixos[palavra[:tamanho]].add(palavra)
+            return
+
+        # A palavra deixou de aparecer no histórico
+        del self.contagens[palavra]
+        for tamanho in range(MINIMO_PREFIXO, min(len(palavra), MAXIMO_PREFIXO) + 1):
+            prefixo = palavra[:tamanho]
+            self.prefixos[prefixo].discard(palavra)
+            if not self.prefixos[prefixo]:
+                del self.prefixos[prefixo]
+
+    # Categoria mais provável para a descrição e o tipo, ou None. A última
+    # palavra, se a descrição não terminar em espaço, é tratada como prefixo.
+    def sugerir(self, descricao, tipo):
+        lista = palavras(descricao)
+        if not lista:
+            return None
+        incompleta = None if str(descricao)[-1:].isspace() else lista.pop()
+
+        pontos = Counter()
+        with self._trava:
+            for palavra in lista:
+                self._pontuar(pontos, [palavra], tipo)
+            if incompleta is not None:
+                conhecidas = [p for p in self.prefixos.get(incompleta[:MAXIMO_PREFIXO], ())
+                              if p.startswith(incompleta)]
+                self._pontuar(pontos, conhecidas, tipo)
+
+        if not pontos:
+            return None
+        return pontos.most_common(1)[0][0]
+
+    # Soma a distribuição de categorias (do tipo pedido) das palavras informadas
+    def _pontuar(self, pontos, lista, tipo):
+        contagem = Counter()
+        for palavra in lista:
+            for (tipo_palavra, categoria), quantidade in self.contagens.get(palavra, {}).items():
+                if tipo_palavra == tipo:
+                    contagem[categoria] += quantidade
+        total = sum(contagem.values())
+        for categoria, quantidade in contagem.items():
+            pontos[categoria] += quantidade / total
+
+    # Categoria sugerida para cada linha (descricao e tipo) de um DataFrame;
+    # None onde não houver sugestão
+    def categorizar(self, transacoes):
+        sugestoes = {}
+        for chave in zip(transacoes['descricao'], transacoes['tipo']):
+            if chave not in sugestoes:
+                sugestoes[chave] = self.sugerir(chave[0] + ' ', chave[1])
+        return pd.Series([sugestoes[chave] for chave in zip(transacoes['descricao'], transacoes['tipo'])],
+                         index=transacoes.index, dtype=object)
@@ -0,0 +1,56 @@
+import json
+import tempfile
+
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+from api import ErroApi, criar_aplicacao, validar_transacao
+
+TRANSACAO = {'data': '2024-01-10', 'descricao': 'Mercado', 'valor': 25.5, 'categoria': 'Alimentação',
+             'tipo': 'saida'}
+
+
+@pytest.mark.parametrize('campos', [
+    {'data': None}, {'data': ''}, {'data': 'ontem'}, {'data': 12345},
+    {'valor': float('inf')}, {'valor': float('nan')}, {'valor': 0}, {'valor': 0.001}, {'valor': True},
+    {'valor': '10'},
+    {'valor': 10 ** 400},
+    {'tipo': 'x'}, {'descricao': ' '},
+])
+def test_validar_transacao_recusa_campos_invalidos(campos):
+    with pytest.raises(ErroApi) as erro:
+        validar_transacao({**TRANSACAO, **campos})
+    assert erro.value.status_code == 400
+
+
+class TestApi(AsyncHTTPTestCase):
+    def get_app(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        return criar_aplicacao(f'{self.diretorio.name}/financas.db')
+
+    def tearDown(self):
+        super().tearDown()
+        self.diretorio.cleanup()
+
+    def enviar(self, caminho, corpo):
+        return self.fetch(caminho, method='POST', body=corpo)
+
+    def test_insere_transacao(self):
+        resposta = self.enviar('/transacoes', json.dumps(TRANSACAO))
+        assert resposta.code == 201
+        assert json.loads(resposta.body) == {'id': 1}
+
+    def test_entradas_invalidas_devolvem_400(self):
+        for corpo in [json.dumps({**TRANSACAO, 'data': None}), json.dumps({**TRANSACAO, 'valor': 1e400}),
+                      '{"data": "2024-01-10", "descricao": "x", "valor": Infinity, "categoria": "x", "tipo": "saida"}',
+                      '{"data": "2024-01-10", "descricao": "x", "valor": NaN, "categoria": "x", "tipo": "saida"}']:
+            assert self.enviar('/transacoes', corpo).code == 400
+
+    def test_lote_com_linha_invalida_devolve_400(self):
+        resposta = self.enviar('/transacoes/lote', json.dumps([TRANSACAO, {**TRANSACAO, 'valor': 1e400}]))
+        assert resposta.code == 400
+
+    def test_id_maior_que_int64_devolve_404(self):
+        assert self.fetch('/transacoes/99999999999999999999', method='DELETE').code == 404
+        resposta = self.fetch('/transacoes/99999999999999999999', method='PUT', body=json.dumps(TRANSACAO))
+        assert resposta.code == 404
@@ -0,0 +1,83 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from armazenamento import Armazenamento
+
+
+def escrever_planilha(caminho, transacoes):
+    with pd.ExcelWriter(caminho) as writer:
+        pd.DataFrame(transacoes).to_excel(writer, sheet_name='Transacoes', index=False)
+        pd.DataFrame({'tipo': ['saida'], 'categoria': ['Pets']}).to_excel(writer, sheet_name='Categorias', index=False)
+
+
+def test_planilha_antiga_descarta_linhas_invalidas_e_importa_uma_vez(tmp_path):
+    planilha = tmp_path / 'financas.xlsx'
+    escrever_planilha(planilha, {
+        'id': [1, 2, 3],
+        'data': [pd.Timestamp('2024-01-10'), None, pd.Timestamp('2024-01-12')],
+        'descricao': ['Ração', 'Sem data', 'Salário'],
+        'valor': [50.0, 10.0, 1000.0],
+        'categoria': ['Pets', 'Outros', 'Salário'],
+        'tipo': ['saida', 'saida', 'entrada'],
+    })
+    armazenamento = Armazenamento(str(tmp_path / 'financas.db'))
+
+    assert armazenamento.importar_planilha_antiga(str(planilha)) == {'importadas': 2, 'invalidas': 1}
+    assert armazenamento.carregar_transacoes().index.tolist() == [1, 3]
+    assert armazenamento.importar_planilha_antiga(str(planilha)) is None
+    assert len(armazenamento.carregar_transacoes()) == 2
+
+
+def test_planilha_antiga_e_tentada_de_novo_apos_falha(tmp_path):
+    planilha = tmp_path / 'financas.xlsx'
+    planilha.write_bytes(b'nao e uma planilha')
+    armazenamento = Armazenamento(str(tmp_path / 'financas.db'))
+    with pytest.raises(Exception):
+        armazenamento.importar_planilha_antiga(str(planilha))
+
+    escrever_planilha(planilha, {'data': [pd.Timestamp('2024-01-10')], 'descricao': ['Ração'], 'valor': [50.0],
+                                 'categoria': ['Pets'], 'tipo': ['saida']})
+    reaberto = Armazenamento(str(tmp_path / 'financas.db'))
+    assert reaberto.importar_planilha_antiga(str(planilha)) == {'importadas': 1, 'invalidas': 0}
+
+
+def test_banco_sem_planilha_nao_importa_depois(tmp_path):
+    armazenamento = Armazenamento(str(tmp_path / 'financas.db'))
+    assert armazenamento.importar_planilha_antiga(str(tmp_path / 'financas.xlsx')) is None
+    escrever_planilha(tmp_path / 'financas.xlsx', {'data': [pd.Timestamp('2024-01-10')], 'descricao': ['Ração'],
+                                                   'valor': [50.0], 'categoria': ['Pets'], 'tipo': ['saida']})
+    assert armazenamento.importar_planilha_antiga(str(tmp_path / 'financas.xlsx')) is None
+
+
+# Depois de concluída, a verificação não depende da trava de escrita
+def test_planilha_antiga_importada_nao_espera_gravacoes(tmp_path):
+    armazenamento = Armazenamento(str(tmp_path / 'financas.db'))
+    assert armazenamento.importar_planilha_antiga(str(tmp_path / 'financas.xlsx')) is None
+
+    outra_sessao = Armazenamento(str(tmp_path / 'financas.db'))
+    bloqueio = sqlite3.connect(str(tmp_path / 'financas.db'))
+    bloqueio.execute('BEGIN IMMEDIATE')
+    try:
+        assert outra_sessao.importar_planilha_antiga(str(tmp_path / 'financas.xlsx')) is None
+        assert outra_sessao.planilha_importada
+    finally:
+        bloqueio.rollback()
+        bloqueio.close()
+
+
+# A versão e as transações vêm da mesma fotografia do banco, mesmo com uma
+# gravação feita entre as duas consultas
+def test_transacoes_versionadas_lidas_na_mesma_transacao(armazenamento, transacao, monkeypatch):
+    armazenamento.inserir_transacao(transacao())
+    outra_sessao = Armazenamento(armazenamento.arquivo)
+    leitura_original = pd.read_sql_query
+
+    def ler_depois_de_gravar(*argumentos, **opcoes):
+        outra_sessao.inserir_transacao(transacao())
+        return leitura_original(*argumentos, **opcoes)
+
+    monkeypatch.setattr(pd, 'read_sql_query', ler_depois_de_gravar)
+    versao, transacoes = armazenamento.carregar_transacoes_versionadas()
+    assert (versao, len(transacoes)) == (1, 1)
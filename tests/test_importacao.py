@@ -0,0 +1,25 @@
+import io
+
+import pandas as pd
+import pytest
+
+from importacao import _converter_datas, blocos_csv
+
+
+# Datas ISO são lidas como ano-mês-dia e as demais com o dia primeiro
+def test_converter_datas_iso_e_dia_primeiro():
+    datas = _converter_datas(pd.Series(['2025-02-03', '03/02/2025', ' 2025-12-31 ', '31/12/2025']))
+    assert datas.tolist() == [pd.Timestamp('2025-02-03'), pd.Timestamp('2025-02-03'),
+                              pd.Timestamp('2025-12-31'), pd.Timestamp('2025-12-31')]
+
+
+def test_converter_datas_invalidas_ou_em_branco_viram_nat():
+    datas = _converter_datas(pd.Series(['', 'ontem', None, '2025-13-01', '32/01/2025']))
+    assert datas.isna().all()
+
+
+def test_blocos_csv_recusa_coluna_em_dois_campos():
+    arquivo = io.BytesIO('Data;Histórico;Valor\n03/02/2025;Mercado;-10,00\n'.encode())
+    mapeamento = {'data': 'Data', 'descricao': 'Histórico', 'valor': 'Valor', 'tipo': 'Histórico'}
+    with pytest.raises(ValueError):
+        next(blocos_csv(arquivo, mapeamento))
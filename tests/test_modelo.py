@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from modelo import substituir_transacoes, tipar_transacoes
+
+
+def tabela(linhas):
+    return tipar_transacoes(pd.DataFrame(linhas, columns=['id', 'data', 'descricao', 'valor_centavos', 'categoria',
+                                                          'tipo']))
+
+
+def referencia(transacoes, removidos, novas):
+    partes = [parte for parte in [transacoes[~transacoes.index.isin(removidos)], novas] if not parte.empty]
+    return tipar_transacoes(pd.concat(partes))
+
+
+def conferir(transacoes, removidos, novas):
+    resultado = substituir_transacoes(transacoes, removidos, novas)
+    esperado = referencia(transacoes, removidos, novas)
+    assert resultado.index.tolist() == esperado.index.tolist()
+    assert resultado['categoria'].astype(str).tolist() == esperado['categoria'].astype(str).tolist()
+    assert resultado.drop(columns='categoria').equals(esperado.drop(columns='categoria'))
+    assert isinstance(resultado['categoria'].dtype, pd.CategoricalDtype)
+
+
+def test_substituir_transacoes_mantem_ordem_por_data_e_id():
+    rng = np.random.default_rng(0)
+    transacoes = tabela({
+        'id': np.arange(1, 201),
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 20, 200), 'D'),
+        'descricao': 'Mercado',
+        'valor_centavos': rng.integers(1, 1000, 200),
+        'categoria': rng.choice(['Alimentação', 'Transporte'], 200),
+        'tipo': 'saida',
+    })
+    editadas = tabela(transacoes.loc[[5, 50, 120]].assign(data=pd.Timestamp('2024-01-07'), categoria='Pets'))
+    incluidas = tabela({'id': [201, 202], 'data': [pd.Timestamp('2024-01-03'), pd.Timestamp('2024-02-01')],
+                        'descricao': 'Nova', 'valor_centavos': 1, 'categoria': 'Lazer', 'tipo': 'entrada'})
+
+    conferir(transacoes, [], incluidas)
+    conferir(transacoes, [], incluidas.iloc[1:])
+    conferir(transacoes, [5, 50, 120], editadas)
+    conferir(transacoes, [7, 8, 9], transacoes.iloc[:0])
+    conferir(transacoes, [5, 50, 120, 201, 202], pd.concat([editadas, incluidas]).pipe(tipar_transacoes))
+    # Muitas alterações espalhadas: tabela montada por índice
+    espalhadas = tabela(transacoes.iloc[::2].assign(valor_centavos=0))
+    conferir(transacoes, espalhadas.index.tolist(), espalhadas)
+    assert substituir_transacoes(transacoes, [], transacoes.iloc[:0]) is transacoes
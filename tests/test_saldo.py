@@ -0,0 +1,35 @@
+import pandas as pd
+
+
+# Uma sessão que ainda tem a versão anterior não pode consumir a invalidação
+# feita pela sincronização de outra sessão
+def test_serie_de_versao_anterior_nao_consome_invalidacao(armazenamento, memoria, transacao):
+    armazenamento.inserir_transacao(transacao('2024-01-10', 10.0))
+
+    versao_a, transacoes_a = memoria.obter_versionado()
+    memoria.saldo_corrente.serie(transacoes_a, versao_a)
+
+    armazenamento.inserir_transacao(transacao('2024-02-01', 5.0))
+    versao_b, transacoes_b = memoria.obter_versionado()
+
+    serie_a = memoria.saldo_corrente.serie(transacoes_a, versao_a)
+    assert serie_a['saldo_acumulado'].tolist() == [10.0]
+
+    serie_b = memoria.saldo_corrente.serie(transacoes_b, versao_b)
+    assert serie_b['saldo_acumulado'].tolist() == [10.0, 15.0]
+    assert serie_b['data'].tolist() == [pd.Timestamp('2024-01-10'), pd.Timestamp('2024-02-01')]
+
+    # E a versão anterior continua correta depois da nova
+    assert memoria.saldo_corrente.serie(transacoes_a, versao_a)['saldo_acumulado'].tolist() == [10.0]
+
+
+def test_serie_recalcula_so_a_partir_do_mes_alterado(armazenamento, memoria, transacao):
+    armazenamento.inserir_transacao(transacao('2024-01-10', 10.0))
+    armazenamento.inserir_transacao(transacao('2024-03-10', 1.0))
+    versao, transacoes = memoria.obter_versionado()
+    memoria.saldo_corrente.serie(transacoes, versao)
+
+    armazenamento.inserir_transacao(transacao('2024-02-01', 5.0))
+    versao, transacoes = memoria.obter_versionado()
+    assert memoria.saldo_corrente.invalido_desde is not None
+    assert memoria.saldo_corrente.serie(transacoes, versao)['saldo_acumulado'].tolist() == [10.0, 15.0, 16.0]
@@ -0,0 +1,20 @@
+def test_sugestor_acompanha_alteracoes_sem_carregar_transacoes(armazenamento, memoria, transacao):
+    id_uber = armazenamento.inserir_transacao(transacao(descricao='Uber centro', categoria='Transporte', tipo='saida'))
+    armazenamento.inserir_transacao(transacao(descricao='Mercado', categoria='Alimentação', tipo='saida'))
+
+    assert memoria.obter_sugestor().sugerir('ub', 'saida') == 'Transporte'
+    assert memoria.transacoes is None
+
+    # Edição: sai a categoria anterior e entra a nova
+    armazenamento.atualizar_transacao(id_uber, transacao(descricao='Uber centro', categoria='Lazer', tipo='saida'))
+    assert memoria.obter_sugestor().sugerir('ub', 'saida') == 'Lazer'
+    assert memoria.obter_sugestor().contagens['uber'] == {('saida', 'Lazer'): 1}
+
+    # Inclusão seguida de exclusão entre duas consultas não deixa rastro
+    id_taxi = armazenamento.inserir_transacao(transacao(descricao='Taxi', categoria='Transporte', tipo='saida'))
+    armazenamento.excluir_transacao(id_taxi)
+    armazenamento.excluir_transacao(id_uber)
+    sugestor = memoria.obter_sugestor()
+    assert 'taxi' not in sugestor.contagens and 'uber' not in sugestor.contagens
+    assert sugestor.sugerir('mer', 'saida') == 'Alimentação'
+    assert memoria.transacoes is None